@@ -0,0 +1,106 @@
+"""
+Accuracy-parity check for embedding backends.
+
+Embeds a fixed corpus with the reference torch backend and with a candidate backend,
+then reports per-text cosine similarity, nearest-neighbour agreement and throughput.
+Exits with status 1 when the candidate drifts below the thresholds.
+
+Usage (from backend/):
+    python -m benchmarks.embedding_parity --backend onnx-int8
+    python -m benchmarks.embedding_parity --backend onnx --pdf-dir store/pdfs
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+from services import embedder, sectionizer
+
+FIXED_CORPUS = [
+    "Introduction to the system architecture and its main components.",
+    "The rotor assembly part XJ-42 must be inspected every 500 hours.",
+    "NASA guidelines require redundant power supplies for flight hardware.",
+    "Table 3 lists the configuration values for each deployment region.",
+    "Quarterly revenue grew by 12 percent driven by subscription sales.",
+    "Photosynthesis converts light energy into chemical energy in plants.",
+    "The patient presented with fever, cough and shortness of breath.",
+    "To reset the device, hold the power button for ten seconds.",
+    "Machine learning models can overfit when the training set is small.",
+    "The treaty was signed in 1648, ending the Thirty Years' War.",
+    "Use a torque wrench to tighten the bolts to 35 Nm.",
+    "Section 4.2 describes the error handling of the ingestion pipeline.",
+    "Climate change increases the frequency of extreme weather events.",
+    "The API returns HTTP 503 until the service is ready.",
+    "Customers can return products within 30 days of purchase.",
+    "Vector databases index embeddings for fast similarity search.",
+    "The compiler optimizes loops by unrolling and vectorizing them.",
+    "Safety goggles must be worn in the laboratory at all times.",
+    "A balanced diet includes fruits, vegetables and whole grains.",
+    "The board approved the merger after a lengthy review.",
+]
+
+def load_corpus(pdf_dir):
+    texts = list(FIXED_CORPUS)
+    if pdf_dir:
+        for pdf_path in sorted(Path(pdf_dir).glob("*.pdf")):
+            for sec in sectionizer.split_into_sections(str(pdf_path)):
+                combined = f"{sec['header']}\n{sec['text']}".strip()
+                if combined:
+                    texts.append(combined)
+    return texts
+
+def timed_encode(backend, texts, batch_size):
+    start = time.perf_counter()
+    vectors = np.vstack([backend.encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+    return vectors.astype("float32"), time.perf_counter() - start
+
+def normalize(v):
+    return v / np.clip(np.linalg.norm(v, axis=1, keepdims=True), 1e-12, None)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="onnx-int8", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--pdf-dir", help="also embed the sections of every PDF in this directory")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-topk-overlap", type=float, default=0.9)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.pdf_dir)
+    reference = embedder.create_backend("torch")
+    candidate = embedder.create_backend(args.backend)
+    # Warm both up so one-time graph setup is not timed
+    reference.encode(texts[:2]); candidate.encode(texts[:2])
+
+    ref_vecs, ref_time = timed_encode(reference, texts, args.batch_size)
+    cand_vecs, cand_time = timed_encode(candidate, texts, args.batch_size)
+    ref_vecs, cand_vecs = normalize(ref_vecs), normalize(cand_vecs)
+
+    cosine = (ref_vecs * cand_vecs).sum(axis=1)
+    k = min(args.top_k, len(texts) - 1)
+    ref_nn = np.argsort(-(ref_vecs @ ref_vecs.T), axis=1)[:, 1:k + 1]
+    cand_nn = np.argsort(-(cand_vecs @ cand_vecs.T), axis=1)[:, 1:k + 1]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_nn, cand_nn)])
+
+    report = {
+        "backend": args.backend,
+        "texts": len(texts),
+        "cosine_min": float(cosine.min()),
+        "cosine_mean": float(cosine.mean()),
+        f"top{k}_overlap": float(overlap),
+        "reference_texts_per_s": len(texts) / ref_time,
+        "candidate_texts_per_s": len(texts) / cand_time,
+        "speedup": ref_time / cand_time,
+    }
+    print(json.dumps(report, indent=2))
+
+    ok = cosine.min() >= args.min_cosine and overlap >= args.min_topk_overlap
+    if not ok:
+        print("Parity check FAILED", file=sys.stderr)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Local fake LLM server for the benchmarks: speaks enough of the Gemini REST API
+(generateContent and streamGenerateContent?alt=sse) for services/llm.py to talk to it
+over real HTTP, with a configurable latency. Answers come from llm.FakeBackend.respond.
+
+Standalone usage (from backend/):
+    python -m benchmarks.fake_servers --port 8931 --latency-ms 300
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8931 uvicorn main:app
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _GeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency = 0.2
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _payload(text: str, prompt_tokens: int, output_tokens: int) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens},
+        }
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        try:
+            prompt = request["contents"][0]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            return self._send_json(400, {"error": {"message": "no prompt"}})
+        from services.llm import FakeBackend  # lazily: services.llm checks its settings on import
+        response = FakeBackend.respond(prompt)
+
+        if ":streamGenerateContent" not in self.path:
+            time.sleep(self.latency)
+            return self._send_json(200, self._payload(response.text, response.prompt_tokens, response.output_tokens))
+
+        # Server-sent events, a few words per event, spread over the same latency
+        words = response.text.split(" ")
+        chunks = [" ".join(words[i:i + 4]) + " " for i in range(0, len(words), 4)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            event = f"data: {json.dumps(self._payload(chunk, response.prompt_tokens, response.output_tokens))}\r\n\r\n"
+            data = event.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+class FakeGeminiServer:
+    """Runs the fake Gemini API on a background thread; port 0 picks a free port."""
+    def __init__(self, latency_ms: float = 200, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (_GeminiHandler,), {"latency": latency_ms / 1000.0})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-gemini", daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+    os.environ.setdefault("LLM_PROVIDER", "fake")  # this process needs no API key
+    server = FakeGeminiServer(args.latency_ms, port=args.port)
+    print(f"Fake Gemini API listening on {server.url}")
+    server.server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+End-to-end benchmark of the ingest, search and generation paths.
+
+1. Ingest: synthetic PDFs (configurable page counts and heading densities) are timed per
+   stage: parse, heading detection, sectionize, embed, index add and save, plus a full
+   ingestion.ingest_pdfs() run over all of them.
+2. Search: /search is load-tested at increasing corpus sizes (crossing the Flat -> IVFPQ
+   upgrade_threshold), per mode, reporting QPS, p50/p99 latency and RSS.
+3. Generation: /insights and /podcast run against a local fake Gemini server (real HTTP
+   through services/llm.py) and the fake TTS backend (the Azure Speech SDK cannot be pointed
+   at a local server), cold and cached.
+
+Everything runs in a scratch working directory (its own store/), in process, through the
+FastAPI routers. Results are printed and written as JSON to compare across commits.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline --fake-embeddings --output bench.json
+    python -m benchmarks.pipeline --pages 10 100 --heading-density 0.05 0.3 --corpus-sizes 500 2000 12000
+    python -m benchmarks.pipeline --stages search --concurrency 32 --queries 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+WORDS = (
+    "system engine value rotor assembly inspection hours power supply flight hardware table "
+    "configuration deployment region revenue subscription energy pipeline error handling vector "
+    "index similarity search compiler loop safety laboratory merger review torque bolts device "
+    "reset model training data climate weather customer return policy protocol sensor"
+).split()
+# Synthetic text draws from a Zipf-like vocabulary (the words above first, then rarer made-up
+# terms), so term frequencies, and with them BM25 costs, resemble real documents
+VOCABULARY = WORDS + [f"term{i}" for i in range(5000)]
+_WEIGHTS = [1.0 / rank for rank in range(1, len(VOCABULARY) + 1)]
+
+def words(rnd: random.Random, count: int) -> list:
+    return rnd.choices(VOCABULARY, weights=_WEIGHTS, k=count)
+
+# --- Synthetic data ---
+def make_pdf(path: Path, pages: int, heading_density: float, seed: int = 0):
+    """
+    Writes a PDF with a running header/footer on every page and, per text line slot, a
+    numbered bold heading with probability `heading_density`, else a paragraph.
+    """
+    import fitz
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 30), "ACME Technical Manual - Confidential", fontsize=8)
+        page.insert_text((72, 820), f"Page {page_number}", fontsize=8)
+        y = 70
+        while y < 760:
+            if rnd.random() < heading_density:
+                title = " ".join(w.title() for w in words(rnd, rnd.randint(2, 4)))
+                page.insert_text(
+                    (72, y), f"{rnd.randint(1, 9)}.{rnd.randint(1, 9)} {title}",
+                    fontsize=rnd.choice([13, 14, 16]), fontname="hebo",
+                )
+                y += 24
+            else:
+                text = " ".join(words(rnd, rnd.randint(25, 50))) + "."
+                page.insert_textbox(fitz.Rect(72, y, 520, y + 50), text, fontsize=10)
+                y += 58
+    doc.save(str(path))
+    doc.close()
+
+def synthetic_sections(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    return [
+        {
+            "pdf": f"synthetic_{i % 50}.pdf",
+            "page": i % 200 + 1,
+            "header": " ".join(w.title() for w in words(rnd, 3)),
+            "text": " ".join(words(rnd, rnd.randint(30, 120))),
+        }
+        for i in range(count)
+    ]
+
+# --- Measurement helpers ---
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024, 1)
+
+def percentiles(latencies: list) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = round(time.perf_counter() - self.start, 4)
+
+def make_app(*routers):
+    from fastapi import FastAPI
+    app = FastAPI()
+    for prefix, router in routers:
+        app.include_router(router, prefix=prefix)
+    return app
+
+def asgi_client(app):
+    """An httpx client that calls the app in process (responses are buffered, not streamed)."""
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600)
+
+async def timed_ndjson(app, path: str, payload) -> list:
+    """
+    POSTs to a streaming NDJSON endpoint by calling the ASGI app directly, so every line is
+    timestamped when the app sends it. Returns [(seconds since the request, event)].
+    """
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    events, buffer, start = [], b"", time.perf_counter()
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # the client stays connected
+
+    async def send(message):
+        nonlocal buffer
+        if message["type"] == "http.response.body":
+            buffer += message.get("body", b"")
+            *lines, buffer = buffer.split(b"\n")
+            events.extend((round(time.perf_counter() - start, 4), json.loads(line)) for line in lines if line)
+
+    await app(scope, receive, send)
+    return events
+
+# --- 1. Ingest ---
+def bench_ingest(args, workdir: Path) -> dict:
+    from services import embedder, indexer, ingestion, pdf_reader, sectionizer
+
+    pdf_dir = workdir / "pdfs"
+    pdf_dir.mkdir(exist_ok=True)
+    faiss_indexer = indexer.get_indexer()
+    embedder.get_model()  # loading the model is not part of any stage
+
+    runs, pdf_paths = [], []
+    for pages in args.pages:
+        for density in args.heading_density:
+            path = pdf_dir / f"synthetic_{pages}p_{int(density * 100)}h.pdf"
+            with Timer() as generate:
+                make_pdf(path, pages, density, seed=args.seed)
+            pdf_paths.append(path)
+
+            faiss_indexer.reset()
+            with Timer() as parse:
+                layout = pdf_reader.extract_layout(path)
+            with Timer() as detect:
+                headings = pdf_reader.detect_headings(layout)
+            with Timer() as split:
+                sections = sectionizer.sections_from_layout(str(path), layout)
+            with Timer() as embed:
+                vectors, metadata = embedder.embed_sections(sections)
+            with Timer() as add:
+                faiss_indexer.add(np.array(vectors, dtype="float32"), metadata)
+            with Timer() as save:
+                faiss_indexer.save()
+
+            run = {
+                "pages": pages,
+                "heading_density": density,
+                "headings": len(headings),
+                "sections": len(sections),
+                "generate_pdf_s": generate.seconds,
+                "parse_s": parse.seconds,
+                "heading_detection_s": detect.seconds,
+                # sections_from_layout() runs its own heading detection: it is included here
+                "sectionize_s": split.seconds,
+                "embed_s": embed.seconds,
+                "index_add_s": add.seconds,
+                "save_s": save.seconds,
+            }
+            run["total_s"] = round(parse.seconds + split.seconds + embed.seconds + add.seconds + save.seconds, 4)
+            run["pages_per_s"] = round(pages / run["total_s"], 1) if run["total_s"] else None
+            print(f"ingest {pages:>5} pages, density {density:.2f}: {run['sections']} sections in {run['total_s']}s")
+            runs.append(run)
+
+    # The real pipeline over every generated PDF: parse pool + one embedding pass + index + manifest
+    ingestion.reset_corpus()
+    with Timer() as end_to_end:
+        documents = ingestion.ingest_pdfs(pdf_paths)
+    faiss_indexer.wait_for_build()
+    print(f"ingest_pdfs: {documents} documents in {end_to_end.seconds}s")
+    return {
+        "runs": runs,
+        "end_to_end": {
+            "documents": documents,
+            "pages": sum(pdf_reader.page_count(p) for p in pdf_paths),
+            "vectors": faiss_indexer.ntotal,
+            "seconds": end_to_end.seconds,
+            "parse_workers": ingestion.PARSE_WORKERS,
+        },
+    }
+
+# --- 2. Search ---
+async def _load_test(client, queries: list, concurrency: int, top_k: int, mode: str) -> dict:
+    latencies, errors = [], 0
+    pending = iter(queries)
+
+    async def worker():
+        nonlocal errors
+        for query in pending:
+            start = time.perf_counter()
+            response = await client.post("/search/", json={"query": query, "top_k": top_k, "mode": mode})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    with Timer() as elapsed:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return dict(
+        {"mode": mode, "queries": len(queries), "errors": errors, "qps": round(len(queries) / elapsed.seconds, 1)},
+        **percentiles(latencies),
+    )
+
+def bench_search(args) -> list:
+    from routers import search
+    from services import embedder, indexer
+
+    faiss_indexer = indexer.get_indexer()
+    faiss_indexer.reset()
+    embedder.get_model()
+    rnd = random.Random(args.seed)
+    results = []
+
+    async def run():
+        async with asgi_client(make_app(("/search", search.router))) as client:
+            # Warm-up (first encode, first search on a fresh index)
+            await client.post("/search/", json={"query": "warm up", "top_k": args.top_k})
+            corpus = 0
+            for size in sorted(args.corpus_sizes):
+                if size > corpus:
+                    vectors, metadata = embedder.embed_sections(synthetic_sections(size - corpus, seed=corpus))
+                    indexer.add_to_index(vectors, metadata)
+                    corpus = size
+                    # Measure the index the corpus settles on (background IVF build done, log compacted)
+                    faiss_indexer.wait_for_build()
+                    faiss_indexer.save()
+                # Random word combinations: the result cache never hits
+                queries = [" ".join(words(rnd, rnd.randint(2, 5))) for _ in range(args.queries)]
+                for mode in args.search_modes:
+                    row = await _load_test(client, queries, args.concurrency, args.top_k, mode)
+                    row.update(corpus=faiss_indexer.ntotal, index_type=faiss_indexer.index_type,
+                               concurrency=args.concurrency, rss_mb=rss_mb())
+                    print(f"search {row['corpus']:>7} vectors ({row['index_type']}, {mode}): "
+                          f"{row['qps']} qps, p50 {row['p50_ms']} ms, p99 {row['p99_ms']} ms")
+                    results.append(row)
+
+    asyncio.run(run())
+    return results
+
+# --- 3. Generation ---
+def bench_generation(args) -> dict:
+    from benchmarks.fake_servers import FakeGeminiServer
+    from routers import insights, podcast
+    from services import llm
+
+    server = FakeGeminiServer(args.llm_latency_ms, port=args.llm_port)
+    server.start()
+    os.environ["GEMINI_API_ENDPOINT"] = server.url
+    # The client reads its endpoint at creation: point a fresh one at the fake server
+    llm.set_backend(llm.GeminiBackend(endpoint=server.url, api_key="benchmark"))
+
+    sections = [
+        {"Header": s["header"], "Page": s["page"], "PDF_Name": s["pdf"], "Content": s["text"]}
+        for s in synthetic_sections(args.sections, seed=args.seed + 1)
+    ]
+    report = {"llm_latency_ms": args.llm_latency_ms, "tts_latency_ms": args.tts_latency_ms, "sections": len(sections)}
+
+    app = make_app(("/insights", insights.router), ("/podcast", podcast.router))
+
+    async def run():
+        async with asgi_client(app) as client:
+            for label in ("insights_cold", "insights_cached"):
+                with Timer() as t:
+                    response = await client.post("/insights/", json=sections)
+                report[label] = {"seconds": t.seconds, "status": response.status_code}
+
+            # Streaming podcast: time to first script line, to the audio URL, to the finished file
+            marks = {}
+            with Timer() as t:
+                for seconds, event in await timed_ndjson(app, "/podcast/stream", sections):
+                    marks.setdefault(f"{event['type']}_s", seconds)  # first event of each type
+            report["podcast_stream_cold"] = dict(marks, seconds=t.seconds)
+
+            with Timer() as t:
+                response = await client.post("/podcast/", json=sections)
+            report["podcast_cached"] = {"seconds": t.seconds, "status": response.status_code}
+
+            # Identical concurrent requests for new content are coalesced into one generation
+            fresh = [dict(s, Content=s["Content"] + " (variant)") for s in sections]
+            calls_before = llm.stats()["calls"]
+            with Timer() as t:
+                responses = await asyncio.gather(*(client.post("/podcast/", json=fresh) for _ in range(args.concurrency)))
+            report["podcast_coalesced"] = {
+                "requests": args.concurrency,
+                "seconds": t.seconds,
+                "llm_calls": llm.stats()["calls"] - calls_before,
+                "errors": sum(r.status_code != 200 for r in responses),
+            }
+        report["llm"] = llm.stats()
+        # The pooled connections belong to this loop, which asyncio.run() closes next
+        await llm.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.stop()
+    for key in ("insights_cold", "insights_cached", "podcast_stream_cold", "podcast_cached", "podcast_coalesced"):
+        print(f"{key}: {report[key]}")
+    return report
+
+# --- Main ---
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", default=["ingest", "search", "generation"],
+                        choices=["ingest", "search", "generation"])
+    parser.add_argument("--pages", nargs="+", type=int, default=[10, 50, 200])
+    parser.add_argument("--heading-density", nargs="+", type=float, default=[0.05, 0.2])
+    parser.add_argument("--corpus-sizes", nargs="+", type=int, default=[500, 2000, 12000])
+    parser.add_argument("--search-modes", nargs="+", default=["vector", "hybrid"], choices=["vector", "lexical", "hybrid"])
+    parser.add_argument("--queries", type=int, default=500, help="queries per corpus size and mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=8, help="sections sent to /insights and /podcast")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-port", type=int, default=0, help="fake Gemini server port (0 = any free port)")
+    parser.add_argument("--tts-latency-ms", type=float, default=200)
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="hash-based vectors instead of the embedding model (times everything but the model)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="scratch directory (default: a new temporary one)")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    # Settings are read when the services are imported, so they are set first
+    os.environ["SEARCH_RESULT_CACHE_SIZE"] = "0"
+    os.environ["WARMUP_ON_STARTUP"] = "0"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["TTS_PROVIDER"] = "fake"
+    os.environ["FAKE_TTS_LATENCY_MS"] = str(args.tts_latency_ms)
+    if args.fake_embeddings:
+        os.environ["EMBEDDING_BACKEND"] = "fake"
+    output = Path(args.output).resolve() if args.output else None
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bench-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(workdir)  # store/ is relative to the working directory
+    print(f"Working directory: {workdir}")
+
+    from services import embedder, indexer
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "embedding_backend": embedder.EMBEDDING_BACKEND,
+            "upgrade_threshold": indexer.get_indexer().upgrade_threshold,
+            "args": vars(args),
+        }
+    }
+    if "ingest" in args.stages:
+        report["ingest"] = bench_ingest(args, workdir)
+    if "search" in args.stages:
+        report["search"] = bench_search(args)
+    if "generation" in args.stages:
+        report["generation"] = bench_generation(args)
+    report["meta"]["rss_mb"] = rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+        print(f"Report written to {output}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
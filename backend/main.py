@@ -1,9 +1,34 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import ingest, search, insights, podcast
+import importlib
+import logging
 import os
+import threading
+import time
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+
+# Services and routers log through `logging`; LOG_LEVEL=WARNING keeps only problems
+logging.basicConfig(format="%(levelname)s:%(name)s: %(message)s")
+for _logger in ("services", "routers"):
+    logging.getLogger(_logger).setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+# --- 0. Router imports (timed, so import cost stays visible) ---
+ROUTER_IMPORT_MS = {}
+
+def _import_router(name: str):
+    start = time.perf_counter()
+    module = importlib.import_module(f"routers.{name}")
+    ROUTER_IMPORT_MS[name] = round((time.perf_counter() - start) * 1000, 1)
+    return module
+
+ingest = _import_router("ingest")
+search = _import_router("search")
+insights = _import_router("insights")
+podcast = _import_router("podcast")
+print(f"Router import times (ms): {ROUTER_IMPORT_MS}")
+
+from services import embedder, indexer, llm, metrics
 
 app = FastAPI(title="Adobe Hackathon Backend")
 
@@ -16,6 +41,10 @@ origins = [
     "http://localhost:8080",  # when running Docker
 ]
 
+# Per-request tracing spans; not installed at all when off
+if metrics.TRACING_ENABLED:
+    app.add_middleware(metrics.TracingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -45,6 +74,52 @@ app.include_router(podcast.router, prefix="/podcast", tags=["Podcast"])
 def health():
     return {"message": "Backend is running 🚀"}
 
+# --- 4b. Readiness: embedding model + FAISS index loaded ---
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+def _warm_up():
+    start = time.perf_counter()
+    try:
+        indexer.get_indexer()
+        embedder.get_model()
+        print(f"Warm-up complete in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+
+@app.on_event("startup")
+def start_warm_up():
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm.aclose()
+
+@app.get("/api/ready")
+def ready():
+    status = {
+        "model_loaded": embedder.is_ready(),
+        "index_loaded": indexer.is_ready(),
+        "router_import_ms": ROUTER_IMPORT_MS,
+    }
+    status["ready"] = status["model_loaded"] and status["index_loaded"]
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# --- 4c. LLM call metrics (latency, tokens) ---
+@app.get("/api/llm_stats")
+def llm_stats():
+    return llm.stats()
+
+# --- 4d. Prometheus metrics (per-stage latency histograms, cache hit rates, index gauges) ---
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/traces")
+def traces():
+    """Most recent request traces (requires TRACING_ENABLED=1)."""
+    return {"enabled": metrics.TRACING_ENABLED, "traces": metrics.recent_traces()}
+
 # --- 5. Catch-all for React Router (important if you use client-side routing) ---
 if os.path.exists(FRONTEND_DIR):
     @app.get("/{full_path:path}")
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, UploadFile 
+import asyncio
+from fastapi import APIRouter, UploadFile, HTTPException
 from pathlib import Path 
 import shutil 
-from services import pdf_reader, sectionizer, embedder, indexer 
+from services import ingestion
+from services.jobs import _jobs
 router = APIRouter() 
 PDF_STORE = Path("store/pdfs") 
 PDF_STORE.mkdir(parents=True, exist_ok=True) # 🔹 Utility function to save a PDF immediately 
@@ -13,49 +15,52 @@ async def save_pdf(file: UploadFile) -> Path:
         shutil.copyfileobj(file.file, buffer) 
     return pdf_path 
 
-# 🔹 Process a saved PDF (extract text, embed, index) 
-async def process_pdf(pdf_path: Path): 
-    sections = sectionizer.split_into_sections(pdf_path) 
-    vectors, metadata = embedder.embed_sections(sections) 
-    indexer.add_to_index(vectors, metadata) 
-
 # 🔹 Bulk PDF upload endpoint 
 
 @router.post("/upload_bulk") 
 async def upload_bulk(files: list[UploadFile]): 
+    # Delete FAISS index + metadata + append log + manifest, then start from an empty index.
+    # Jobs still running on the old corpus are cancelled at their next commit point.
+    await asyncio.to_thread(ingestion.reset_corpus)
+
     # Delete existing PDFs 
     if PDF_STORE.exists(): 
         for file in PDF_STORE.iterdir(): 
             if file.is_file(): 
                 file.unlink() 
             
-    # Delete FAISS index + metadata 
-    if indexer._indexer.index_path.exists(): 
-        indexer._indexer.index_path.unlink() 
-    if indexer._indexer.meta_path.exists(): 
-        indexer._indexer.meta_path.unlink() 
-
-    # Clear in-memory FAISS index 
-    indexer._indexer.load() # initializes empty index 
     # Save PDFs immediately 
     saved_paths = [] 
     for file in files: 
         path = await save_pdf(file) 
         saved_paths.append(str(path)) 
+
+    # Parse + embed in the background; poll /ingest/jobs/{job_id} for progress
+    job = _jobs.submit([Path(p) for p in saved_paths])
     
     return { 
         "message": f"Uploaded {len(files)} bulk PDFs successfully", 
-        "saved_paths": saved_paths 
+        "saved_paths": saved_paths,
+        "job_id": job.id
     } 
 
 # 🔹 Single PDF upload endpoint 
 @router.post("/upload_single") 
 async def upload_single(file: UploadFile): 
     path = await save_pdf(file) 
+    # Only new or changed PDFs are processed, see services.ingestion.ingest_pdfs
     all_pdf_paths = list(PDF_STORE.glob("*.pdf"))
-    for pdf_path in all_pdf_paths:
-        await process_pdf(pdf_path)
+    job = _jobs.submit(all_pdf_paths)
     return { 
         "message": f"Uploaded single PDF '{file.filename}' successfully", 
-        "saved_path": str(path) 
-    }
\ No newline at end of file
+        "saved_path": str(path),
+        "job_id": job.id
+    }
+
+# 🔹 Ingestion job status 
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job.to_dict()
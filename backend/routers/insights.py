@@ -1,19 +1,34 @@
 # backend/routers/insights.py
+import asyncio
+import json
+import logging
 import os
-import google.generativeai as genai
+import random
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
+from services import llm, metrics
+from services.cache import PersistentCache, content_key
 
-# --- IMPORTANT SECURITY FIX ---
-# Load the API key from an environment variable.
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+logger = logging.getLogger(__name__)
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable is not set!")
+# --- Fan-out configuration ---
+# At most this many LLM calls in flight at once, shared by all concurrent /insights requests
+INSIGHTS_CONCURRENCY = int(os.getenv("INSIGHTS_CONCURRENCY", "4"))
+# Per-section timeout (seconds) for one LLM call, and how often a failed call is retried
+INSIGHTS_TIMEOUT = float(os.getenv("INSIGHTS_TIMEOUT", "30"))
+INSIGHTS_RETRIES = int(os.getenv("INSIGHTS_RETRIES", "2"))
+# Base delay (seconds) of the exponential backoff between retries
+INSIGHTS_BACKOFF = float(os.getenv("INSIGHTS_BACKOFF", "0.5"))
+# Generated insights are kept on disk, keyed by hash(section content + model); "0" disables it
+INSIGHTS_CACHE = os.getenv("INSIGHTS_CACHE", "1") == "1"
+INSIGHTS_CACHE_PATH = os.getenv("INSIGHTS_CACHE_PATH", "store/insights.sqlite")
 
-genai.configure(api_key=GEMINI_API_KEY)
+_insight_cache = PersistentCache(INSIGHTS_CACHE_PATH) if INSIGHTS_CACHE else None
+if _insight_cache is not None:
+    metrics.register_cache("insights", _insight_cache)
+_llm_slots = asyncio.Semaphore(max(1, INSIGHTS_CONCURRENCY))
 
 # Pydantic model for a single section
 class Section(BaseModel):
@@ -22,44 +37,97 @@ class Section(BaseModel):
     PDF_Name: str
     Content: str
 
-# --- THIS IS THE CORRECTED FUNCTION ---
-def generate_snippet(text: str) -> str:
-    """Generates a single, concise insight from the provided text using the LLM."""
-    try:
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        
-        # The prompt now correctly includes the 'text' variable. This is the fix.
-        # This structure clearly separates the instruction from the content for the LLM.
-        prompt = f"""
-        Extract a single, punchy, and actionable insight from the text below. 
-        Make it memorable, clear, and immediately useful, without extra commentary, quotes, or formatting. 
-        Keep it to one line.
-        TEXT TO ANALYZE:
-        ---
-        {text}
-        ---
-        """
-        
-        # The full prompt (instructions + text) is now correctly sent to the model.
-        response = model.generate_content(prompt)
-        return response.text.strip()
-        
-    except Exception as e:
-        print(f"An error occurred with the Gemini API: {e}")
-        return f"Error: Failed to generate insight. Details: {str(e)}"
+def _insight_prompt(text: str) -> str:
+    # This structure clearly separates the instruction from the content for the LLM.
+    prompt = f"""
+    Extract a single, punchy, and actionable insight from the text below.
+    Make it memorable, clear, and immediately useful, without extra commentary, quotes, or formatting.
+    Keep it to one line.
+    TEXT TO ANALYZE:
+    ---
+    {text}
+    ---
+    """
+    return prompt
+
+async def generate_insight(text: str) -> str:
+    """
+    Generates a single, concise insight from the text with the LLM. The call runs under the
+    shared concurrency limit, with a timeout, and is retried with exponential backoff + jitter.
+    Only successful insights are cached.
+    """
+    client = llm.get_client()
+    key = content_key(client.model, text)
+    if _insight_cache is not None:
+        cached = await asyncio.to_thread(_insight_cache.get, key)
+        if cached is not None:
+            return cached
 
-# --- New Batch Generation Endpoint (This part was already correct) ---
+    error = None
+    for attempt in range(INSIGHTS_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(INSIGHTS_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        try:
+            async with _llm_slots:
+                insight = await asyncio.wait_for(
+                    client.agenerate(_insight_prompt(text), timeout=INSIGHTS_TIMEOUT), INSIGHTS_TIMEOUT
+                )
+            break
+        except Exception as e:
+            error = e
+            logger.warning("Insight attempt %d/%d failed: %r", attempt + 1, INSIGHTS_RETRIES + 1, e)
+    else:
+        return f"Error: Failed to generate insight. Details: {str(error) or type(error).__name__}"
+
+    if _insight_cache is not None:
+        await asyncio.to_thread(_insight_cache.put, key, insight)
+    return insight
+
+# --- Batch Generation Endpoint ---
 router = APIRouter()
 
 @router.post("/")
 async def generate_batch_insights(sections: List[Section]):
     """
     API endpoint to generate an insight for a list of document sections.
+    Sections are processed concurrently (identical contents only once); order is preserved.
     """
-    insights = []
-    for section in sections:
-        # Correctly calls the helper with the content of each section
-        snippet = generate_snippet(section.Content)
-        insights.append(snippet)
-    
-    return {"insights": insights}
\ No newline at end of file
+    contents = [section.Content for section in sections]
+    unique = list(dict.fromkeys(contents))
+    generated = dict(zip(unique, await asyncio.gather(*(generate_insight(text) for text in unique))))
+    return {"insights": [generated[text] for text in contents]}
+
+@router.post("/stream")
+async def stream_batch_insights(sections: List[Section]):
+    """
+    Streaming variant of the batch endpoint (NDJSON): one {"type": "insight", "index", "insight"}
+    line per section as soon as its insight is ready, in completion order, then {"type": "done"}.
+    """
+    contents = [section.Content for section in sections]
+    positions = {}
+    for index, text in enumerate(contents):
+        positions.setdefault(text, []).append(index)
+
+    async def generate(text: str):
+        return text, await generate_insight(text)
+
+    async def events():
+        tasks = [asyncio.ensure_future(generate(text)) for text in positions]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                text, insight = await next_done
+                for index in positions[text]:
+                    yield json.dumps({"type": "insight", "index": index, "insight": insight}) + "\n"
+            yield json.dumps({"type": "done"}) + "\n"
+        finally:
+            # Client went away: stop the calls that are still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache_stats")
+async def cache_stats():
+    return {"insights": _insight_cache.stats() if _insight_cache is not None else None}
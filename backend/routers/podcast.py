@@ -1,15 +1,19 @@
 # backend/routers/podcast.py
 
+import asyncio
+import json
 import os
+import re
 import uuid
-import google.generativeai as genai
+from pathlib import Path
 # --- MODIFIED ---
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 # ----------------
 from pydantic import BaseModel
-from typing import List
-import azure.cognitiveservices.speech as speechsdk
-import xml.sax.saxutils as saxutils
+from typing import AsyncIterator, List, Tuple
+from services import llm, metrics, tts
+from services.cache import content_key
 
 # --- Pydantic Models for Input Validation ---
 class Section(BaseModel):
@@ -18,22 +22,10 @@ class Section(BaseModel):
     PDF_Name: str
     Content: str
 
-# --- Gemini API Configuration ---
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
-
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable is not set!")
-genai.configure(api_key=GEMINI_API_KEY)
-
-
 # --- STEP 1: LLM SCRIPT GENERATION ---
-def generate_conversational_script(sections: List[Section]) -> str:
-    print("Generating conversational script from sections...")
-    try:
-        source_text = "\n---\n".join([s.Content for s in sections])
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        prompt = f"""
+def _script_prompt(sections: List[Section]) -> str:
+    source_text = "\n---\n".join([s.Content for s in sections])
+    return f"""
         You are a scriptwriter for a podcast. Your task is to convert the following source text from a document into an engaging and natural-sounding conversational script between two hosts: Alex (the curious host) and Anya (the expert).
 
         Instructions:
@@ -48,69 +40,198 @@ def generate_conversational_script(sections: List[Section]) -> str:
         {source_text}
         ---
         """
-        response = model.generate_content(prompt)
-        print("Script generated successfully.")
-        return response.text.strip()
-    except Exception as e:
-        print(f"An error occurred with the Gemini API during script generation: {e}")
-        raise
+
+async def stream_conversational_script(sections: List[Section]) -> AsyncIterator[str]:
+    """Yields each non-empty script line as soon as the LLM has streamed it completely."""
+    buffer = ""
+    async for chunk in llm.get_client().astream(_script_prompt(sections)):
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+    if buffer.strip():
+        yield buffer.strip()
 
 # --- STEP 2: MULTI-VOICE TTS SYNTHESIS ---
-def synthesize_multi_voice_audio(script: str) -> str:
+PODCASTS_DIR = Path("store/podcasts")
+# How often a reader of a podcast that is still being synthesized checks for new audio
+AUDIO_POLL_SECONDS = 0.1
+
+def _podcast_paths(podcast_id: str) -> Tuple[Path, Path]:
+    """(audio being written, finished audio) for a podcast ID."""
+    return PODCASTS_DIR / f"{podcast_id}.mp3.part", PODCASTS_DIR / f"{podcast_id}.mp3"
+
+async def synthesize_podcast(script: str, podcast_id: str = None) -> str:
+    """
+    Synthesizes the script turn by turn through the TTS pool. Segments are appended in script
+    order to <id>.mp3.part as they complete (so it can be streamed meanwhile), and the file is
+    renamed to <id>.mp3 when done. Returns the URL of the finished file.
+    """
     print("Synthesizing multi-voice audio from script...")
-    speech_key = os.getenv("AZURE_TTS_KEY")
-    service_region = os.getenv("AZURE_TTS_ENDPOINT")
+    podcast_id = podcast_id or str(uuid.uuid4())
+    PODCASTS_DIR.mkdir(parents=True, exist_ok=True)
+    part_path, file_path = _podcast_paths(podcast_id)
+    turns = tts.split_turns(script)
+    try:
+        with open(part_path, "wb") as f:
+            async for audio in tts.synthesize_turns(turns):
+                f.write(audio)
+                f.flush()
+        part_path.replace(file_path)
+    except BaseException as e:
+        print(f"Speech synthesis failed: {e}")
+        part_path.unlink(missing_ok=True)
+        raise
+    print(f"Podcast generated successfully at: {file_path} ({len(turns)} turns)")
+    return f"/podcasts/{file_path.name}"
+
+async def _follow_audio(podcast_id: str) -> AsyncIterator[bytes]:
+    """Yields the audio of a podcast as it is written, until the finished file has been read."""
+    part_path, file_path = _podcast_paths(podcast_id)
+    position = 0
+    while True:
+        finished = file_path.exists()
+        try:
+            with open(file_path if finished else part_path, "rb") as f:
+                f.seek(position)
+                data = f.read()
+        except FileNotFoundError:
+            if file_path.exists():
+                continue  # renamed between the check and the open
+            return  # synthesis failed
+        if data:
+            position += len(data)
+            yield data
+        elif finished:
+            return
+        else:
+            await asyncio.sleep(AUDIO_POLL_SECONDS)
 
-    if not speech_key or not service_region:
-        raise ValueError("AZURE_TTS_KEY or AZURE_TTS_ENDPOINT environment variables are not set.")
+# --- STEP 3: CONTENT-ADDRESSED CACHE ---
+# Podcasts are stored as <key>.mp3 (+ <key>.txt script) where key = hash(sections, model, voices);
+# least recently used ones are deleted once the directory grows past this many bytes
+PODCAST_CACHE_BYTES = int(os.getenv("PODCAST_CACHE_BYTES", str(1024 * 1024 * 1024)))
+_podcast_cache_counter = metrics.CacheCounter()
+metrics.register_cache("podcasts", _podcast_cache_counter)
+
+def podcast_key(sections: List[Section]) -> str:
+    client = llm.get_client()
+    return content_key(
+        client.backend.name, client.model, tts.TTS_PROVIDER, tts.ALEX_VOICE, tts.ANYA_VOICE,
+        *(section.Content for section in sections),
+    )
+
+def _script_path(key: str) -> Path:
+    return PODCASTS_DIR / f"{key}.txt"
+
+def _cached_podcast(key: str):
+    """(script lines, URL) of a finished podcast, marked as recently used; None if not cached."""
+    file_path, script_path = _podcast_paths(key)[1], _script_path(key)
     try:
-        region = service_region.split('.')[0].replace('https://', '')
-    except Exception:
-        raise ValueError("AZURE_TTS_ENDPOINT is not a valid endpoint URL.")
-
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=region)
-    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz64KBitRateMonoMp3)
-
-    alex_voice = "en-US-DavisNeural"
-    anya_voice = "en-US-AriaNeural"
-
-    ssml_parts = [
-        '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="en-US">',
-        f'<voice name="{alex_voice}">',
-        'Welcome to your audio summary.',
-        '<break time="1s"/>',
-        '</voice>'
-    ]
-    for line in script.strip().split('\n'):
-        line = line.strip()
-        if not line: continue
-        sanitized_dialogue = saxutils.escape(line)
-        if line.lower().startswith('alex:'):
-            dialogue = sanitized_dialogue.replace('Alex:', '', 1).strip()
-            ssml_parts.append(f'<voice name="{alex_voice}">{dialogue}<break time="750ms"/></voice>')
-        elif line.lower().startswith('anya:'):
-            dialogue = sanitized_dialogue.replace('Anya:', '', 1).strip()
-            ssml_parts.append(f'<voice name="{anya_voice}">{dialogue}<break time="750ms"/></voice>')
-    ssml_parts.append('</speak>')
-    ssml_string = "".join(ssml_parts)
-    
-    podcasts_dir = "store/podcasts"
-    os.makedirs(podcasts_dir, exist_ok=True)
-    file_name = f"{uuid.uuid4()}.mp3"
-    file_path = os.path.join(podcasts_dir, file_name)
-
-    audio_config = speechsdk.audio.AudioOutputConfig(filename=file_path)
-    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-    result = synthesizer.speak_ssml_async(ssml_string).get()
-
-    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-        print(f"Podcast generated successfully at: {file_path}")
-        return f"/podcasts/{file_name}"
-    else:
-        cancellation_details = result.cancellation_details
-        error_message = f"Speech synthesis failed: {cancellation_details.reason} - {cancellation_details.error_details}"
-        print(error_message)
-        raise Exception(error_message)
+        os.utime(file_path)  # the modification time orders LRU eviction
+        os.utime(script_path)
+        script = script_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        if not file_path.exists():
+            _podcast_cache_counter.record(hit=False)
+            return None
+        script = ""
+    _podcast_cache_counter.record(hit=True)
+    return [line for line in script.split("\n") if line.strip()], f"/podcasts/{file_path.name}"
+
+def _evict(keep: set):
+    """Deletes least recently used podcasts (audio + script) until the directory fits the budget."""
+    entries, total = [], 0
+    for path in PODCASTS_DIR.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        total += stat.st_size
+        if path.suffix == ".mp3" and path.stem not in keep:
+            script_path = _script_path(path.stem)
+            size = stat.st_size + (script_path.stat().st_size if script_path.exists() else 0)
+            entries.append((stat.st_mtime, size, path, script_path))
+    entries.sort()
+    evicted = 0
+    for _, size, path, script_path in entries:
+        if total <= PODCAST_CACHE_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        script_path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    metrics.PODCAST_EVICTIONS.inc(evicted)
+
+class _PodcastJob:
+    """
+    One generation (script, then audio) of a podcast key. Identical requests arriving while it
+    runs attach to it instead of starting their own; events() replays progress from the start,
+    so every subscriber sees all script lines.
+    """
+    def __init__(self, key: str, sections: List[Section]):
+        self.key = key
+        self.lines: List[str] = []
+        self.audio_url = None
+        self.podcast_url = None
+        self.error = None
+        self.done = False
+        self._changed = asyncio.Condition()
+        self.task = asyncio.create_task(self._run(sections))
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _run(self, sections: List[Section]):
+        try:
+            async for line in stream_conversational_script(sections):
+                self.lines.append(line)
+                await self._notify()
+            script = "\n".join(self.lines)
+            PODCASTS_DIR.mkdir(parents=True, exist_ok=True)
+            _script_path(self.key).write_text(script, encoding="utf-8")
+            _podcast_paths(self.key)[0].touch()  # readable before the first segment exists
+            self.audio_url = f"/podcast/audio/{self.key}"
+            await self._notify()
+            self.podcast_url = await synthesize_podcast(script, self.key)
+        except Exception as e:
+            print(f"Error during podcast creation: {e}")
+            self.error = e
+        finally:
+            self.done = True
+            _jobs.pop(self.key, None)
+            await self._notify()
+            await asyncio.to_thread(_evict, set(_jobs))
+
+    async def events(self) -> AsyncIterator[dict]:
+        sent_lines, sent_audio = 0, False
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: self.done or len(self.lines) > sent_lines or (self.audio_url and not sent_audio)
+                )
+            for line in self.lines[sent_lines:]:
+                yield {"type": "line", "line": line}
+            sent_lines = len(self.lines)
+            if self.audio_url and not sent_audio:
+                sent_audio = True
+                yield {"type": "audio", "podcast_url": self.audio_url}
+            if self.done:
+                if self.error is not None:
+                    yield {"type": "error", "detail": str(self.error)}
+                else:
+                    yield {"type": "done", "podcast_url": self.podcast_url}
+                return
+
+_jobs = {}  # podcast key -> running _PodcastJob
+
+def _get_job(key: str, sections: List[Section]) -> _PodcastJob:
+    job = _jobs.get(key)
+    if job is None:
+        job = _jobs[key] = _PodcastJob(key, sections)
+    return job
 
 # --- FastAPI Router and Endpoint ---
 router = APIRouter()
@@ -120,15 +241,53 @@ async def create_conversational_podcast_endpoint(sections: List[Section]):
     """
     Orchestrates the full workflow:
     1. Generates a conversational script from sections using an LLM.
-    2. Synthesizes the script into a multi-voice audio file using Azure TTS.
-    Returns a URL to the generated audio file.
+    2. Synthesizes the script into a multi-voice audio file using Azure TTS (turns in parallel).
+    Returns a URL to the generated audio file; identical sections are served from the cache.
     """
-    try:
-        script = generate_conversational_script(sections)
-        podcast_url = synthesize_multi_voice_audio(script)
-        return {"podcast_url": podcast_url}
-    # --- MODIFIED ---
-    except Exception as e:
-        print(f"Error during podcast creation: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-    # ----------------
\ No newline at end of file
+    key = podcast_key(sections)
+    cached = _cached_podcast(key)
+    if cached is not None:
+        return {"podcast_url": cached[1]}
+
+    # Shielded: the generation is shared and outlives a client that disconnects
+    job = _get_job(key, sections)
+    await asyncio.shield(job.task)
+    if job.error is not None:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(job.error)}")
+    return {"podcast_url": job.podcast_url}
+
+@router.post("/stream")
+async def stream_conversational_podcast(sections: List[Section]):
+    """
+    Streaming variant (NDJSON): {"type": "line", "line"} for every script line while the LLM
+    writes the script, then {"type": "audio", "podcast_url"} as soon as synthesis starts (that
+    URL streams the audio while it is produced), {"type": "done", "podcast_url"} with the final
+    file once synthesis completes, or {"type": "error", "detail"} if a step fails.
+    A cached podcast is replayed at once: its script lines, then the final file as the audio.
+    """
+    key = podcast_key(sections)
+
+    async def events():
+        cached = _cached_podcast(key)
+        if cached is not None:
+            lines, podcast_url = cached
+            for line in lines:
+                yield json.dumps({"type": "line", "line": line}) + "\n"
+            yield json.dumps({"type": "audio", "podcast_url": podcast_url}) + "\n"
+            yield json.dumps({"type": "done", "podcast_url": podcast_url}) + "\n"
+            return
+        async for event in _get_job(key, sections).events():
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(
+        events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/audio/{podcast_id}")
+async def stream_podcast_audio(podcast_id: str):
+    """Audio of a podcast, streamed while it is still being synthesized (then the whole file)."""
+    if not re.fullmatch(r"[0-9a-f-]{1,64}", podcast_id) or not any(
+        path.exists() for path in _podcast_paths(podcast_id)
+    ):
+        raise HTTPException(status_code=404, detail="Unknown podcast.")
+    return StreamingResponse(_follow_audio(podcast_id), media_type="audio/mpeg", headers={"Cache-Control": "no-cache"})
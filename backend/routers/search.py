@@ -1,15 +1,75 @@
+import asyncio
+import os
+from typing import List, Literal, Optional, Union
 from fastapi import APIRouter
 from pydantic import BaseModel
-from services import embedder, indexer
+from services import embedder, indexer, metrics
+from services.batcher import _batcher
+from services.cache import LRUCache
 
 router = APIRouter()
 
+# Optional result cache keyed on (query, top_k, min_score, filter, index version); 0 disables it
+RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "512"))
+# Default relevance cutoff (cosine similarity) when a request does not set min_score
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0")) or None
+# Hybrid mode: each ranker contributes HYBRID_CANDIDATE_FACTOR * top_k candidates to the fusion
+# (at most HYBRID_CANDIDATES), and the RRF rank constant
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("SEARCH_HYBRID_CANDIDATE_FACTOR", "4"))
+HYBRID_CANDIDATES = int(os.getenv("SEARCH_HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K = int(os.getenv("SEARCH_HYBRID_RRF_K", "60"))
+_result_cache = LRUCache(RESULT_CACHE_SIZE)
+metrics.register_cache("search_results", _result_cache)
+_result_cache_version = None
+
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 3
+    min_score: Optional[float] = None  # drop results scoring below this (cosine similarity)
+    # Optional filters, applied inside the index search: PDF name(s) and an inclusive page range
+    pdf: Optional[Union[str, List[str]]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    # "vector" (embeddings), "lexical" (BM25 keywords) or "hybrid" (both, fused by reciprocal rank).
+    # In hybrid mode min_score only applies to the vector candidates and Score is the fused RRF score.
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
 
 @router.post("/")
 async def search(req: SearchRequest):
-    query_vec = embedder.embed_query(req.query)
-    results = indexer.search(query_vec, req.top_k)
+    global _result_cache_version
+    version = indexer.index_version()  # None until the first search has loaded the index (off the event loop)
+    if version != _result_cache_version:
+        # Index changed: older entries can never hit again
+        _result_cache.clear()
+        _result_cache_version = version
+
+    min_score = req.min_score if req.min_score is not None else SEARCH_MIN_SCORE
+    search_filter = indexer.make_filter(req.pdf, req.page_from, req.page_to)
+    key = (embedder.normalize_query(req.query), req.top_k, min_score, search_filter, req.mode, version)
+    results = _result_cache.get(key)
+    if results is None:
+        with metrics.span(f"search.{req.mode}"):
+            if req.mode == "vector":
+                results = await _batcher.search(req.query, req.top_k, min_score, search_filter)
+            elif req.mode == "lexical":
+                results = await asyncio.to_thread(indexer.lexical_search, req.query, req.top_k, search_filter)
+            else:
+                results = await _hybrid_search(req.query, req.top_k, min_score, search_filter)
+        _result_cache.put(key, results)
     return {"results": results}
+
+async def _hybrid_search(query: str, top_k: int, min_score: Optional[float], search_filter) -> list:
+    """Vector and BM25 lookups run concurrently, so hybrid costs about as much as the slower of the two."""
+    candidates = max(top_k, min(HYBRID_CANDIDATES, HYBRID_CANDIDATE_FACTOR * top_k))
+    vector_results, lexical_results = await asyncio.gather(
+        _batcher.search(query, candidates, min_score, search_filter),
+        asyncio.to_thread(indexer.lexical_search, query, candidates, search_filter),
+    )
+    return indexer.fuse_rrf([vector_results, lexical_results], top_k, HYBRID_RRF_K)
+
+@router.get("/cache_stats")
+async def cache_stats():
+    return {
+        "query_embeddings": embedder.query_cache_stats(),
+        "results": _result_cache.stats(),
+    }
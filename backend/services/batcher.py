@@ -0,0 +1,87 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import List, Optional, Tuple
+from . import embedder, indexer
+
+# --- Configuration ---
+# Queries arriving within this window are embedded and searched together (0 disables batching)
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "3"))
+# A batch is flushed early once it holds this many queries
+SEARCH_MAX_BATCH = int(os.getenv("SEARCH_MAX_BATCH", "32"))
+
+def _run_batch(queries: List[str], top_ks: List[int], min_scores: List[Optional[float]], filters: list) -> List[list]:
+    """
+    One encode call for the whole batch and one index search per distinct filter
+    (a single one in the common unfiltered case). Runs on a worker thread.
+    """
+    vectors = embedder.embed_queries(queries)
+    groups = defaultdict(list)
+    for i, search_filter in enumerate(filters):
+        groups[search_filter].append(i)
+
+    results = [None] * len(queries)
+    for search_filter, rows in groups.items():
+        group_results = indexer.search_many(
+            [vectors[i] for i in rows], [top_ks[i] for i in rows], [min_scores[i] for i in rows], search_filter
+        )
+        for i, result in zip(rows, group_results):
+            results[i] = result
+    return results
+
+class QueryBatcher:
+    """
+    Coalesces concurrent /search requests. The first query of a batch opens a short window;
+    everything that arrives before it closes (or before the batch is full) is answered by
+    a single batched embed + search, and the results are fanned back out to the callers.
+    """
+    def __init__(self, window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch: int = SEARCH_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[str, int, Optional[float], Optional[tuple], asyncio.Future]] = []
+        self._timer = None
+
+    async def search(self, query: str, top_k: int, min_score: Optional[float] = None, search_filter=None) -> list:
+        """`search_filter` comes from indexer.make_filter()."""
+        if self.window <= 0:
+            return (await asyncio.to_thread(_run_batch, [query], [top_k], [min_score], [search_filter]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_k, min_score, search_filter, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._execute(batch))
+
+    async def _execute(self, batch: List[Tuple[str, int, Optional[float], Optional[tuple], asyncio.Future]]):
+        queries, top_ks, min_scores, filters, futures = (list(column) for column in zip(*batch))
+        try:
+            results = await asyncio.to_thread(_run_batch, queries, top_ks, min_scores, filters)
+        except Exception:
+            # Retry one by one so a single bad query only fails its own request
+            for query, top_k, min_score, search_filter, future in batch:
+                if future.done():
+                    continue
+                try:
+                    result = (await asyncio.to_thread(_run_batch, [query], [top_k], [min_score], [search_filter]))[0]
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+# --- Singleton instance ---
+_batcher = QueryBatcher()
@@ -1,9 +1,158 @@
-from sentence_transformers import SentenceTransformer
+import hashlib
+import os
+import re
+import threading
 import numpy as np
-from typing import List, Dict, Tuple, Iterator
+from pathlib import Path
+from typing import List, Dict, Tuple, Iterable, Iterator
+from . import metrics
+from .cache import LRUCache
 
-# --- Model Loading ---
-_model = SentenceTransformer("all-MiniLM-L6-v2")
+# --- Configuration ---
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+MAX_SEQ_LENGTH = 256  # same truncation as the SentenceTransformer config
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8 | fake
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", "store/models"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0")) or None  # seconds, 0 = no expiry
+
+# --- Embedding backends ---
+class TorchBackend:
+    """Reference backend: full-precision PyTorch inference through SentenceTransformer."""
+    name = "torch"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, show_progress_bar=False)
+
+def export_onnx(quantized: bool = False) -> Path:
+    """
+    Exports MiniLM to ONNX once (and an int8 dynamically quantized copy if asked).
+    Files are cached under ONNX_MODEL_DIR and written via a temp file + rename.
+    """
+    ONNX_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    fp32_path = ONNX_MODEL_DIR / f"{MODEL_NAME}.onnx"
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        print(f"Exporting '{HF_MODEL_ID}' to ONNX at {fp32_path}...")
+        model = AutoModel.from_pretrained(HF_MODEL_ID).eval()
+        dummy = AutoTokenizer.from_pretrained(HF_MODEL_ID)(["export"], return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ["input_ids", "attention_mask", "token_type_ids", "last_hidden_state"]}
+        temp_path = fp32_path.with_suffix(".tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+                str(temp_path),
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        temp_path.replace(fp32_path)
+
+    if not quantized:
+        return fp32_path
+
+    int8_path = ONNX_MODEL_DIR / f"{MODEL_NAME}-int8.onnx"
+    if not int8_path.exists():
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"Quantizing ONNX model to int8 at {int8_path}...")
+        temp_path = int8_path.with_suffix(".tmp")
+        quantize_dynamic(str(fp32_path), str(temp_path), weight_type=QuantType.QInt8)
+        temp_path.replace(int8_path)
+    return int8_path
+
+class OnnxBackend:
+    """
+    MiniLM on ONNX Runtime (CPU), optionally int8 quantized.
+    Reproduces the SentenceTransformer pipeline: mean pooling over the attention mask,
+    then L2 normalization (all-MiniLM-L6-v2 ends with a Normalize module).
+    """
+    def __init__(self, quantized: bool = False):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(export_onnx(quantized)), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np"
+        )
+        feeds = {k: v.astype("int64") for k, v in encoded.items() if k in self.input_names}
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        mask = encoded["attention_mask"][..., None].astype("float32")
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return (pooled / norms).astype("float32")
+
+class FakeBackend:
+    """
+    Model-free stand-in for benchmarks and tests: a deterministic unit vector per text (seeded by
+    its hash), so identical texts match exactly and everything else is unrelated.
+    """
+    name = "fake"
+    dim = 384
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.empty((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def create_backend(name: str = EMBEDDING_BACKEND):
+    if name == "fake":
+        return FakeBackend()
+    if name == "torch":
+        return TorchBackend()
+    if name == "onnx":
+        return OnnxBackend(quantized=False)
+    if name == "onnx-int8":
+        return OnnxBackend(quantized=True)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{name}' (expected torch, onnx, onnx-int8 or fake)")
+
+# --- Model Loading (lazy, thread-safe) ---
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Creates the configured embedding backend on first use. Heavy imports are deferred until then too."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f"Loading embedding model '{MODEL_NAME}' with the '{EMBEDDING_BACKEND}' backend...")
+                _model = create_backend(EMBEDDING_BACKEND)
+    return _model
+
+def is_ready() -> bool:
+    return _model is not None
+
+def encode(texts: List[str]) -> np.ndarray:
+    """
+    Encodes with the configured backend and L2-normalizes the result once here, so the index
+    can use inner product as cosine similarity (a no-op for backends that already normalize).
+    """
+    model = get_model()
+    with metrics.EMBED_BATCH_SECONDS.time(backend=model.name):
+        vectors = np.asarray(model.encode(texts), dtype="float32")
+    metrics.EMBED_BATCH_SIZE.observe(len(texts), backend=model.name)
+    norms = np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors / norms
 
 # --- Helper for Batching ---
 def _batch_iterator(data: list, batch_size: int) -> Iterator[list]:
@@ -46,16 +195,64 @@ def embed_sections(
     # ✅ Encode in batches
     all_vectors = []
     for text_batch in _batch_iterator(valid_texts, batch_size):
-        vectors = _model.encode(text_batch, show_progress_bar=False).tolist()
+        vectors = encode(text_batch).tolist()
         all_vectors.extend(vectors)
 
     return all_vectors, valid_metadata
 
+def embed_section_stream(
+    sections: Iterable[Dict],
+    chunk_size: int = 512,
+    batch_size: int = 64,
+    max_preview_len: int = 2000
+) -> Iterator[Tuple[List[List[float]], List[Dict]]]:
+    """Embeds sections coming from an iterator, yielding (vectors, metadata) every `chunk_size` sections."""
+    chunk = []
+    for sec in sections:
+        chunk.append(sec)
+        if len(chunk) >= chunk_size:
+            yield embed_sections(chunk, batch_size, max_preview_len)
+            chunk = []
+    if chunk:
+        yield embed_sections(chunk, batch_size, max_preview_len)
+
+
+# --- Query embedding cache ---
+_query_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+metrics.register_cache("query_embeddings", _query_cache)
 
+def normalize_query(query: str) -> str:
+    """Cache key for a query. MiniLM is uncased, so case and extra whitespace don't change the vector."""
+    return re.sub(r"\s+", " ", query.strip().lower())
 
 def embed_query(query: str) -> list[float]:
-    """Embed a single query string into a vector."""
+    """Embed a single query string into a vector (served from the LRU cache when possible)."""
     if not isinstance(query, str) or not query.strip():
         raise ValueError("Query must be a non-empty string.")
-    
-    return _model.encode([query], show_progress_bar=False)[0].tolist()
+
+    key = normalize_query(query)
+    vector = _query_cache.get(key)
+    if vector is None:
+        vector = encode([key])[0].tolist()
+        _query_cache.put(key, vector)
+    return vector
+
+def embed_queries(queries: List[str]) -> List[list]:
+    """Embed several queries with a single encode call for the ones not already cached."""
+    keys = []
+    for query in queries:
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("Query must be a non-empty string.")
+        keys.append(normalize_query(query))
+
+    vectors = [_query_cache.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, vec in zip(keys, vectors) if vec is None))
+    if missing:
+        encoded = dict(zip(missing, encode(missing).tolist()))
+        for key, vector in encoded.items():
+            _query_cache.put(key, vector)
+        vectors = [vec if vec is not None else encoded[key] for key, vec in zip(keys, vectors)]
+    return vectors
+
+def query_cache_stats() -> Dict:
+    return _query_cache.stats()
@@ -1,145 +1,768 @@
 import faiss
+import logging
 import numpy as np
 import pickle
+from contextlib import contextmanager
 from pathlib import Path
 import threading
 import math
+import os
+import time
+from . import metrics
+from .cache import LRUCache
+from .metadata_store import MetadataStore
+from .vector_log import VectorLog
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: single worker process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Once an IVF index has grown by this factor since it was trained, it is rebuilt in the background
+INDEX_RETRAIN_GROWTH = float(os.getenv("INDEX_RETRAIN_GROWTH", "4"))
+# The append log is folded into a new faiss.<seq>.index snapshot past this size
+INDEX_COMPACT_BYTES = int(os.getenv("INDEX_COMPACT_BYTES", str(64 * 1024 * 1024)))
+# Memory-map snapshots read-only, so every worker process shares the same pages. faiss >= 1.11
+# (IO_FLAG_MMAP_IFC) maps any index; older releases only map the inverted lists of IVF snapshots
+# (IO_FLAG_MMAP) and read flat ones into each worker's memory.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") == "1"
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+if INDEX_MMAP and _MMAP_FLAG == faiss.IO_FLAG_MMAP:
+    logger.warning("faiss %s cannot memory-map flat indexes; every worker loads its own copy of them.", faiss.__version__)
+# How often (seconds) a worker checks for changes published by other workers (0 disables)
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "1"))
+# Similarity metric for new indexes: cosine (inner product over normalized vectors) | l2
+INDEX_METRIC = os.getenv("INDEX_METRIC", "cosine")
+_METRICS = {"cosine": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+def make_filter(pdf=None, page_from: int = None, page_to: int = None):
+    """
+    Hashable search filter for search()/search_many(), or None when nothing is filtered.
+    `pdf` is one name or a list of names (stored path or bare file name); pages are inclusive.
+    """
+    pdfs = (pdf,) if isinstance(pdf, str) else tuple(pdf or ())
+    if not pdfs and page_from is None and page_to is None:
+        return None
+    return tuple(sorted(pdfs)), page_from, page_to
+
+# faiss wants ~39 training points per centroid; every 8-bit PQ sub-quantizer has 256 of them
+PQ_MIN_TRAINING = 39 * 256
+
+def ivfpq_params(n: int, dim: int = 384):
+    """
+    (nlist, m, nbits) for an IVFPQ over n vectors. nlist follows ~4*sqrt(n) but keeps ~39 training
+    points per centroid. Codes stay at 8 bits with at least 32 sub-quantizers (for 384-d vectors):
+    smaller codes cost far more recall than they save, so small corpora stay flat instead.
+    """
+    nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+    m = 32 if n < 1_000_000 else 48
+    while dim % m:
+        m //= 2
+    return nlist, m, 8
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class ProcessLock:
+    """flock on a file in the store: serializes writers across uvicorn worker processes."""
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @contextmanager
+    def hold(self, exclusive: bool = True):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class IndexSnapshot:
+    """
+    What searches read. `base` is the last compacted index (memory-mapped read-only and shared by
+    every worker process when faiss supports it), `delta` holds the vectors logged since, and `removed` the IDs deleted
+    since. Snapshots are immutable: writers build a new one and swap it in.
+    """
+    __slots__ = ("base", "base_seq", "delta", "removed", "selector", "index_type", "next_id", "version")
+
+    def __init__(self, base, base_seq: int, delta, removed: np.ndarray, index_type: str, next_id: int, version: int):
+        self.base = base
+        self.base_seq = base_seq
+        self.delta = delta
+        self.removed = removed
+        # Hides removed IDs from the base (kept here so the selector outlives every search using it)
+        self.selector = None
+        if len(removed):
+            batch = faiss.IDSelectorBatch(removed)
+            self.selector = (faiss.IDSelectorNot(batch), batch)
+        self.index_type = index_type
+        self.next_id = next_id
+        self.version = version
 
 class FaissIndexer:
     def __init__(self, store_path="store"):
         self.store_path = Path(store_path)
-        self.index_path = self.store_path / "faiss.index"
-        self.meta_path = self.store_path / "metadata.db"
-        
+        self.index_path = self.store_path / "faiss.index"  # pre-versioning snapshot, migrated on load
+        self.meta_path = self.store_path / "metadata.sqlite"
+        self.legacy_meta_path = self.store_path / "metadata.db"  # pickled metadata, migrated on load
+        self.store_path.mkdir(exist_ok=True)
+        self.store = MetadataStore(self.meta_path)
+        self.log = VectorLog(self.store_path / "faiss.log")
+        self.process_lock = ProcessLock(self.store_path / "index.lock")
+
         self.embedding_dim = 384  # MiniLM embedding size
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()  # serializes writers in this process; readers never take it
+        self.save_lock = threading.Lock()
 
-        self.upgrade_threshold = 1000  # auto-upgrade cutoff
-        self.index_type = "flat"
+        self.upgrade_threshold = PQ_MIN_TRAINING  # auto-upgrade cutoff: enough points to train the PQ codebooks
+        if INDEX_METRIC not in _METRICS:
+            raise ValueError(f"Unknown INDEX_METRIC '{INDEX_METRIC}' (expected cosine or l2)")
+        self.metric = _METRICS[INDEX_METRIC]
+        self._snapshot = IndexSnapshot(
+            self._new_flat_index(), 0, self._new_flat_index(), np.empty(0, dtype="int64"), "flat", 0, 0
+        )
+        self._log_seq = 0  # sequence number of the last log record applied
+        self._log_pos = None  # how far this process has read the log
+        self._epoch = 0  # store generation this process has loaded; reset() and in-place rebuilds bump it
+        self._compaction_thread = None
+        self._filter_cache = LRUCache(256)  # (filter, version) -> allowed IDs + selector
 
-        self.store_path.mkdir(exist_ok=True)
         self.load()
+        if INDEX_REFRESH_INTERVAL > 0:
+            threading.Thread(target=self._poll, name="faiss-refresh", daemon=True).start()
+
+    # Read-only views of the current snapshot
+    @property
+    def index_type(self) -> str:
+        return self._snapshot.index_type
+
+    @property
+    def next_id(self) -> int:
+        return self._snapshot.next_id
+
+    @property
+    def version(self) -> int:
+        """Bumped whenever the index contents change."""
+        return self._snapshot.version
+
+    @property
+    def metric_type(self) -> int:
+        """Metric of the index being served (may still differ from self.metric until a rebuild)."""
+        return self._snapshot.delta.metric_type
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live vectors (one metadata row each)."""
+        return self.store.count()
+
+    def base_path(self, seq: int) -> Path:
+        return self.store_path / f"faiss.{seq}.index"
 
+    def _new_flat_index(self, metric: int = None):
+        """Flat index wrapped in an ID map so vectors keep stable IDs across removals."""
+        return faiss.IndexIDMap2(faiss.IndexFlat(self.embedding_dim, self.metric if metric is None else metric))
+
+    def _publish(self, base, base_seq: int, delta, removed: np.ndarray, index_type: str, next_id: int):
+        """Atomically replaces the current snapshot (a single reference assignment)."""
+        self._snapshot = IndexSnapshot(
+            base, base_seq, delta, removed, index_type, next_id, self._snapshot.version + 1
+        )
+
+    # --- Loading & following other writers ---
     def load(self):
-        """Loads the index and metadata from disk."""
-        with self.lock:
-            if self.index_path.exists() and self.meta_path.exists():
-                self.index = faiss.read_index(str(self.index_path))
-                with open(self.meta_path, "rb") as f:
-                    self.metadata = pickle.load(f)
-                
-                if hasattr(self.index, "nlist"):
-                    self.index_type = "ivf"
-                else:
-                    self.index_type = "flat"
-                print(f"Loaded '{self.index_type}' index with {self.index.ntotal} vectors.")
+        """Loads the latest snapshot from disk and replays the append log on top of it."""
+        with self.lock, self.process_lock.hold():
+            self._migrate_legacy_files()
+            self.log.repair()
+            self._log_pos = None
+            self._refresh_locked(recovering=True, reopen=True)
+            snapshot = self._snapshot
+            if snapshot.index_type == "ivf" and not self.store.get_state("trained_on"):
+                self.store.set_state("trained_on", snapshot.base.ntotal)
+            logger.info(
+                "Loaded '%s' index with %d vectors (+%d from the log).",
+                snapshot.index_type, snapshot.base.ntotal, snapshot.delta.ntotal,
+            )
+        self._maybe_start_compaction()
+
+    def _migrate_legacy_files(self):
+        """
+        Imports a pickled metadata.db (list or dict format) into the SQLite store and rewrites an
+        unversioned faiss.index as faiss.<seq>.index, once. Caller holds the writer locks.
+        """
+        if self.legacy_meta_path.exists():
+            with open(self.legacy_meta_path, "rb") as f:
+                payload = pickle.load(f)
+
+            if isinstance(payload, list):
+                # Legacy format: metadata list aligned with sequential vector IDs
+                metadata, next_id, log_seq = dict(enumerate(payload)), len(payload), 0
             else:
-                print("No existing index found. Initializing a new IndexFlatL2.")
-                self.index = faiss.IndexFlatL2(self.embedding_dim)
-                self.metadata = []
-
-    def _reconstruct_all_vectors(self):
-        """Safely reconstruct all vectors from the index (works across FAISS versions)."""
-        vectors = [self.index.reconstruct(i) for i in range(self.index.ntotal)]
-        return np.vstack(vectors).astype("float32") if vectors else np.empty((0, self.embedding_dim), dtype="float32")
-
-    def _check_and_upgrade_index(self, new_vectors_count: int):
-        """Checks if the index should be upgraded from Flat to IVFPQ."""
-        total_vectors = self.index.ntotal + new_vectors_count
-        if self.index_type == "flat" and total_vectors >= self.upgrade_threshold:
-            print(f"Threshold of {self.upgrade_threshold} vectors reached. Upgrading to IndexIVFPQ...")
-            
-            nlist = int(4 * math.sqrt(total_vectors))
-            quantizer = faiss.IndexFlatL2(self.embedding_dim)
-            upgraded_index = faiss.IndexIVFPQ(quantizer, self.embedding_dim, nlist, 32, 8) 
-
-            print(f"Training new index with nlist={nlist} on {self.index.ntotal} existing vectors...")
-            existing_vectors = self._reconstruct_all_vectors()
-            if existing_vectors.shape[0] > 0:
-                upgraded_index.train(existing_vectors)
-                upgraded_index.add(existing_vectors)
-            
-            self.index = upgraded_index
-            self.index_type = "ivf"
-            print("Index upgrade complete.")
-
-    def add(self, vectors: np.ndarray, meta: list):
-        """Adds vectors to the index, handling automatic index upgrades."""
+                metadata, next_id, log_seq = payload["metadata"], payload["next_id"], payload.get("log_seq", 0)
+
+            self.store.put_many(metadata, next_id)
+            self.store.set_state("log_seq", log_seq)
+            self.legacy_meta_path.unlink()
+            logger.info("Migrated %d metadata rows from %s to %s.", len(metadata), self.legacy_meta_path.name, self.meta_path.name)
+
+        if self.index_path.exists():
+            index = faiss.read_index(str(self.index_path))
+            if not hasattr(index, "nlist") and not isinstance(index, faiss.IndexIDMap2):
+                ids, vectors = self._export_vectors(index, "flat")
+                # Keep the legacy metric: _needs_rebuild() then converts (and normalizes) it in the background
+                index = self._new_flat_index(index.metric_type)
+                index.add_with_ids(vectors, ids)
+            # Snapshot files are named after the last log sequence number they contain
+            self._write_base(index, self.store.get_state("log_seq"))
+            self.index_path.unlink()
+
+    def refresh(self) -> bool:
+        """
+        Picks up a newer snapshot or log records written by another worker process.
+        Returns True when the published snapshot changed.
+        """
+        if (
+            self.log.position() == self._log_pos
+            and self.store.get_state("log_seq") == self._snapshot.base_seq
+            and self.store.get_state("epoch") == self._epoch
+        ):
+            return False
+        with self.lock, self.process_lock.hold(exclusive=False):
+            return self._refresh_locked()
+
+    def _poll(self):
+        while True:
+            time.sleep(INDEX_REFRESH_INTERVAL)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Index refresh failed: %s", e)
+
+    def _open_base(self, seq: int):
+        """Opens snapshot `seq` (memory-mapped and read-only when possible); no snapshot at seq 0 means an empty index."""
+        path = self.base_path(seq)
+        if not path.exists():
+            if seq != 0:
+                logger.warning("Snapshot %s is missing; starting from an empty index.", path.name)
+            return self._new_flat_index(), "flat"
+        flags = _MMAP_FLAG | faiss.IO_FLAG_READ_ONLY if INDEX_MMAP else 0
+        index = faiss.read_index(str(path), flags)
+        return index, "ivf" if hasattr(index, "nlist") else "flat"
+
+    def _refresh_locked(self, recovering: bool = False, reopen: bool = False) -> bool:
+        """
+        Brings this process up to date: reopens the base when a newer snapshot was published and
+        applies log records it has not seen yet to a copy of the delta. Caller holds self.lock
+        and the process lock. While `recovering` (at load time) replayed records also repair the
+        metadata store, which a crash may have left one step behind.
+        """
+        current = self._snapshot
+        base_seq = self.store.get_state("log_seq")
+        epoch = self.store.get_state("epoch")
+        # A reset elsewhere restarts log_seq and IDs at 0, a rebuild may keep log_seq: the epoch tells them apart
+        if reopen or base_seq != current.base_seq or epoch != self._epoch:
+            self._epoch = epoch
+            base, index_type = self._open_base(base_seq)
+            # The delta has to score like the base it gets merged with
+            delta = self._new_flat_index(base.metric_type if base.ntotal else self.metric)
+            removed = np.empty(0, dtype="int64")
+            applied, position, changed = base_seq, None, True
+        else:
+            base, index_type = current.base, current.index_type
+            delta, removed = current.delta, current.removed
+            applied, position, changed = self._log_seq, self._log_pos, False
+
+        records, position = self.log.read_new(position)
+        records = [record for record in records if record[0] > applied]
+        if records:
+            delta = faiss.clone_index(delta)
+            for seq, op, payload in records:
+                if op == "add":
+                    start, vectors = payload[0], payload[1]
+                    if recovering and len(payload) > 2:
+                        # Logged before metadata moved to SQLite: the record carries it
+                        self.store.insert(start, payload[2])
+                    self._apply_add(delta, start, vectors)
+                else:
+                    self._apply_remove(delta, payload)
+                    removed = self._with_removed(removed, payload)
+                    if recovering:
+                        self.store.delete_ranges(payload)
+                applied = seq
+            changed = True
+            if recovering:
+                metrics.FAISS_REPLAYED.inc(len(records))
+
+        self._log_seq, self._log_pos = applied, position
+        if changed:
+            self._publish(base, base_seq, delta, removed, index_type, self.store.get_state("next_id"))
+        return changed
+
+    @contextmanager
+    def _writing(self):
+        """Writer section: in-process lock + cross-process lock, caught up with other writers."""
+        with self.lock, self.process_lock.hold():
+            self._refresh_locked()
+            yield
+
+    def reset(self):
+        """
+        Deletes every snapshot, the metadata and the append log, and starts over empty.
+        The store epoch is bumped so other worker processes drop what they had loaded.
+        """
+        with self.save_lock, self.lock, self.process_lock.hold():
+            epoch = self.store.get_state("epoch") + 1
+            for path in self.store_path.glob("faiss*.index"):
+                path.unlink()
+            self.log.clear()
+            self.store.clear()
+            self.store.set_state("epoch", epoch)
+            self._log_pos = None
+            self._refresh_locked(reopen=True)
+
+    # --- Helpers ---
+    @staticmethod
+    def _apply_add(index, start: int, vectors: np.ndarray) -> int:
+        """Adds vectors under sequential IDs starting at `start`; returns the next free ID."""
+        ids = np.arange(start, start + len(vectors), dtype="int64")
+        index.add_with_ids(vectors, ids)
+        return start + len(vectors)
+
+    @staticmethod
+    def _apply_remove(index, id_ranges: list) -> int:
+        return sum(index.remove_ids(faiss.IDSelectorRange(start, end)) for start, end in id_ranges)
+
+    @staticmethod
+    def _with_removed(removed: np.ndarray, id_ranges: list) -> np.ndarray:
+        return np.concatenate([removed] + [np.arange(start, end, dtype="int64") for start, end in id_ranges])
+
+    def _export_vectors(self, index, index_type: str):
+        """
+        Returns (ids, vectors) for everything stored in `index`, in bulk.
+        May build a direct map on IVF indexes, so only call it on an index the caller owns.
+        """
+        n = index.ntotal
+        if n == 0:
+            return np.empty(0, dtype="int64"), np.empty((0, self.embedding_dim), dtype="float32")
+        if isinstance(index, faiss.IndexIDMap2):
+            ids = faiss.vector_to_array(index.id_map).astype("int64")
+            return ids, index.index.reconstruct_n(0, n)
+        if index_type == "ivf":
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            invlists = index.invlists
+            ids = np.concatenate([
+                faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+                for l in range(index.nlist)
+            ]).astype("int64")
+            return ids, index.reconstruct_batch(ids).astype("float32")
+        # Plain flat index: IDs are the sequential positions
+        return np.arange(n, dtype="int64"), index.reconstruct_n(0, n)
+
+    def _write_base(self, index, seq: int):
+        """
+        Writes snapshot `seq` atomically, and durably: callers delete the log and older snapshots
+        right after, so the file and its directory entry are fsynced before returning.
+        """
+        temp_path = self.base_path(seq).with_suffix(".tmp")
+        faiss.write_index(index, str(temp_path))
+        _fsync(temp_path)
+        temp_path.replace(self.base_path(seq))
+        if os.name != "nt":  # directories cannot be opened (or fsynced) on Windows
+            _fsync(self.store_path)
+
+    # --- Compaction & background IVFPQ builds ---
+    def _needs_rebuild(self, snapshot) -> bool:
+        n = self.ntotal
+        if n and snapshot.delta.metric_type != self.metric:
+            return True  # INDEX_METRIC changed: convert the existing index
+        if snapshot.index_type == "flat":
+            return n >= self.upgrade_threshold
+        trained_on = self.store.get_state("trained_on")
+        return trained_on > 0 and n >= trained_on * INDEX_RETRAIN_GROWTH
+
+    def _maybe_start_compaction(self):
+        """
+        Starts a background compaction when the log outgrew INDEX_COMPACT_BYTES, or a background
+        IVFPQ (re)build when the corpus crossed the upgrade threshold or outgrew the last training.
+        Searches and writes keep going against the current snapshot meanwhile.
+        """
+        if self.log.size() < INDEX_COMPACT_BYTES and not self._needs_rebuild(self._snapshot):
+            return
         with self.lock:
-            self._check_and_upgrade_index(len(vectors))
-            
-            if self.index_type == "ivf" and not self.index.is_trained:
-                print("Warning: IVF index is not trained. Training on current batch.")
-                self.index.train(vectors)
+            if self._compaction_thread is not None:
+                return
+            self._compaction_thread = threading.Thread(
+                target=self._compact_in_background, name="faiss-compact", daemon=True
+            )
+            self._compaction_thread.start()
+
+    def _compact_in_background(self):
+        try:
+            self.save()
+        except Exception:
+            logger.exception("Background index compaction failed")
+        finally:
+            self._compaction_thread = None
 
-            self.index.add(vectors)
-            self.metadata.extend(meta)
-        print(f"Added {len(vectors)} new vectors. Index now has {self.index.ntotal} total vectors.")
+    def wait_for_build(self, timeout: float = None) -> bool:
+        """Blocks until a running background compaction/build finishes; returns False on timeout."""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _materialize(self, snapshot):
+        """A private, mutable copy of base + delta - removed (the base file is re-read, not cloned)."""
+        path = self.base_path(snapshot.base_seq)
+        index = faiss.read_index(str(path)) if path.exists() else self._new_flat_index(snapshot.delta.metric_type)
+        if len(snapshot.removed):
+            index.remove_ids(faiss.IDSelectorBatch(snapshot.removed))
+        ids, vectors = self._export_vectors(snapshot.delta, "flat")
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        return index
+
+    def _rebuild(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+        A fresh index with the configured metric: IVFPQ past the upgrade threshold, flat below.
+        Vectors are re-normalized so an older L2 index converts cleanly to cosine.
+        """
+        if self.metric == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(vectors)
+        if len(ids) < self.upgrade_threshold:
+            index = self._new_flat_index()
+            index.add_with_ids(vectors, ids)
+            return index
+
+        nlist, m, nbits = ivfpq_params(len(ids), self.embedding_dim)
+        quantizer = faiss.IndexFlat(self.embedding_dim, self.metric)
+        index = faiss.IndexIVFPQ(quantizer, self.embedding_dim, nlist, m, nbits, self.metric)
+        index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        return index
 
     def save(self):
-        """Saves index + metadata to disk (blocking)."""
-        print("Saving index to disk...")
-        with self.lock:
-            temp_index_path = self.index_path.with_suffix(".tmp")
-            faiss.write_index(self.index, str(temp_index_path))
-            
-            temp_meta_path = self.meta_path.with_suffix(".tmp")
-            with open(temp_meta_path, "wb") as f:
-                pickle.dump(self.metadata, f)
-            
-            temp_index_path.rename(self.index_path)
-            temp_meta_path.rename(self.meta_path)
-        print("Save complete.")
-
-    def search(self, query_vec: np.ndarray, top_k: int = 5, nprobe: int = 10) -> list:
+        """
+        Compaction: folds the log into a new faiss.<seq>.index snapshot that every worker process
+        then memory-maps. Building it (and training an IVFPQ when the corpus calls for it) happens
+        without any lock held; only the final catch-up and publish block writers, never readers.
+        Metadata needs no rewrite, it is already in the SQLite store.
+        """
+        with self.save_lock:
+            with self._writing():
+                snapshot = self._snapshot
+                seq = self._log_seq
+                rebuild = self._needs_rebuild(snapshot)
+            if seq == snapshot.base_seq and not rebuild:
+                return
+
+            start = time.perf_counter()
+            index = self._materialize(snapshot)
+            trained_on = None
+            if rebuild:
+                ids, vectors = self._export_vectors(index, snapshot.index_type)
+                index = self._rebuild(ids, vectors)
+                trained_on = len(ids) if hasattr(index, "nlist") else None
+
+            with self._writing():
+                if self._snapshot.base_seq != snapshot.base_seq:
+                    logger.info("Another worker compacted the index meanwhile; discarding this snapshot.")
+                    return
+                # Catch up with everything logged while the snapshot was being built
+                records, _ = self.log.read_new()
+                for record_seq, op, payload in records:
+                    if record_seq <= seq:
+                        continue
+                    if op == "add":
+                        self._apply_add(index, payload[0], payload[1])
+                    else:
+                        self._apply_remove(index, payload)
+
+                new_seq = self._log_seq
+                self._write_base(index, new_seq)
+                if trained_on is not None:
+                    self.store.set_state("trained_on", trained_on)
+                if new_seq == snapshot.base_seq:
+                    # Rebuilt with nothing logged since: same file name, so only the epoch tells readers to reopen it
+                    self.store.set_state("epoch", self.store.get_state("epoch") + 1)
+                # Publishing point: from here on readers open the new snapshot
+                self.store.set_state("log_seq", new_seq)
+                self.log.clear()
+                for path in self.store_path.glob("faiss.*.index"):
+                    if path != self.base_path(new_seq):
+                        path.unlink()
+                self._log_pos = None
+                self._refresh_locked()
+        seconds = time.perf_counter() - start
+        metrics.FAISS_SAVE_SECONDS.observe(seconds, rebuild=str(rebuild).lower())
+        logger.info("Wrote snapshot %s ('%s' index, rebuild=%s) in %.2fs.", new_seq, self.index_type, rebuild, seconds)
+
+    def maybe_compact(self):
+        """Folds the append log into a fresh snapshot once it grows past INDEX_COMPACT_BYTES."""
+        self._maybe_start_compaction()
+
+    # --- Writes ---
+    def add(self, vectors: np.ndarray, meta: list) -> list:
+        """
+        Adds vectors to the index. They go to a private copy of the delta index that is published
+        when done, so searches keep running against the previous snapshot meanwhile.
+        Returns the [start, end) range of IDs assigned to the new vectors.
+        """
+        with metrics.FAISS_ADD_SECONDS.time(), self._writing():
+            current = self._snapshot
+            start = current.next_id
+            next_id = start + len(vectors)
+            # Metadata first: a crash before the log append only leaves rows no vector points to
+            self.store.insert(start, meta, next_id)
+            # Write-ahead: the change is durable before it becomes visible
+            self._log_pos = self.log.append(self._log_seq + 1, "add", (start, vectors))
+            self._log_seq += 1
+
+            delta = faiss.clone_index(current.delta)
+            self._apply_add(delta, start, vectors)
+            self._publish(current.base, current.base_seq, delta, current.removed, current.index_type, next_id)
+        metrics.FAISS_VECTORS.inc(len(vectors), op="add")
+        self._maybe_start_compaction()
+        return [start, next_id]
+
+    def remove(self, id_ranges: list) -> int:
+        """Removes every vector whose ID falls in one of the given [start, end) ranges."""
+        id_ranges = [list(r) for r in id_ranges]
+        with self._writing():
+            current = self._snapshot
+            self._log_pos = self.log.append(self._log_seq + 1, "remove", id_ranges)
+            self._log_seq += 1
+
+            delta = faiss.clone_index(current.delta)
+            self._apply_remove(delta, id_ranges)
+            removed = self._with_removed(current.removed, id_ranges)
+            self._publish(current.base, current.base_seq, delta, removed, current.index_type, current.next_id)
+            count = self.store.delete_ranges(id_ranges)
+        metrics.FAISS_VECTORS.inc(count, op="remove")
+        return count
+
+    # --- Reads ---
+    def _filter_selector(self, search_filter, snapshot):
+        """
+        (allowed IDs, selector) for a make_filter() filter, resolved through the metadata store's
+        (pdf, page) index once per snapshot version and then reused.
+        """
+        key = (search_filter, snapshot.version)
+        cached = self._filter_cache.get(key)
+        if cached is None:
+            ids = self.store.ids_matching(*search_filter)
+            cached = (ids, faiss.IDSelectorBatch(ids) if len(ids) else None)
+            self._filter_cache.put(key, cached)
+        return cached
+
+    def search(self, query_vec: np.ndarray, top_k: int = 5, nprobe: int = 10, min_score: float = None,
+               search_filter=None) -> list:
         """Searches the index for similar vectors."""
-        with self.lock:
-            if self.index.ntotal == 0:
-                return []
-            
-            if self.index_type == "ivf":
-                self.index.nprobe = nprobe
-            
-            distances, indices = self.index.search(query_vec, top_k)
-            results = [self.metadata[i] for i in indices[0] if i != -1]
+        return self.search_batch(query_vec, top_k, nprobe, min_score, search_filter)[0]
+
+    def search_batch(self, query_vecs: np.ndarray, top_k: int = 5, nprobe: int = 10, min_score: float = None,
+                     search_filter=None) -> list:
+        """
+        Searches several queries in one pass; returns one list of metadata dicts per row, each
+        with a "score" (cosine similarity, higher is better). Hits below min_score are dropped.
+        A filter from make_filter() is pushed into FAISS as an ID selector, so only matching
+        vectors are scored and top_k is filled from them.
+        Lock-free: reads a single snapshot reference, which writers never mutate.
+        """
+        snapshot = self._snapshot
+        allowed = None
+        if search_filter is not None:
+            allowed_ids, allowed = self._filter_selector(search_filter, snapshot)
+            if allowed is None:
+                return [[] for _ in range(len(query_vecs))]
+
+        with metrics.FAISS_SEARCH_SECONDS.time(index_type=snapshot.index_type):
+            parts = []
+            if snapshot.base.ntotal:
+                sel = snapshot.selector[0] if snapshot.selector else None
+                if allowed is not None:
+                    sel = allowed if sel is None else faiss.IDSelectorAnd(allowed, sel)
+                if snapshot.index_type == "ivf":
+                    if allowed is not None:
+                        # A selective filter leaves few candidates per list: probe more lists to fill top_k
+                        fraction = max(len(allowed_ids) / snapshot.base.ntotal, 1e-6)
+                        nprobe = min(snapshot.base.nlist, max(nprobe, int(nprobe / fraction)))
+                    # Per-call parameters instead of setting nprobe on the shared index
+                    params = faiss.SearchParametersIVF(nprobe=nprobe, sel=sel)
+                else:
+                    params = faiss.SearchParameters(sel=sel) if sel is not None else None
+                parts.append(snapshot.base.search(query_vecs, top_k, params=params))
+            if snapshot.delta.ntotal:
+                params = faiss.SearchParameters(sel=allowed) if allowed is not None else None
+                parts.append(snapshot.delta.search(query_vecs, top_k, params=params))
+        if not parts:
+            return [[] for _ in range(len(query_vecs))]
+
+        distances = np.hstack([p[0] for p in parts])
+        indices = np.hstack([p[1] for p in parts])
+        if snapshot.delta.metric_type == faiss.METRIC_L2:
+            # Squared L2 between unit vectors -> cosine similarity
+            scores = 1.0 - distances / 2.0
+        else:
+            scores = distances
+        # Merge base and delta hits, best first
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        indices = np.take_along_axis(indices, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+
+        # Only the rows that were hit are read from the metadata store
+        rows = self.store.get_many(indices.ravel().tolist())
+        results = []
+        for row_ids, row_scores in zip(indices.tolist(), scores.tolist()):
+            results.append([
+                dict(rows[i], id=i, score=score)
+                for i, score in zip(row_ids, row_scores)
+                if i in rows and (min_score is None or score >= min_score)
+            ])
         return results
 
-# --- Singleton instance & service wrappers ---
-_indexer = FaissIndexer()
+    def lexical_search(self, query: str, top_k: int = 5, search_filter=None) -> list:
+        """
+        BM25 keyword search over the same sections, via the metadata store's full-text index.
+        Returns metadata dicts best first with a "score" (negated bm25, higher is better).
+        IDs the current snapshot does not contain (removed, or still being added) are skipped.
+        """
+        snapshot = self._snapshot
+        pdfs, page_from, page_to = search_filter or (None, None, None)
+        # Ask for a few extra to make up for hits the snapshot hides
+        hits = self.store.match(query, top_k + 16, pdfs, page_from, page_to)
+        removed = set(snapshot.removed.tolist()) if len(snapshot.removed) else ()
+        hits = [(i, score) for i, score in hits if i < snapshot.next_id and i not in removed][:top_k]
+        rows = self.store.get_many(i for i, _ in hits)
+        return [dict(rows[i], id=i, score=score) for i, score in hits if i in rows]
+
+# --- Singleton instance (lazy, thread-safe) & service wrappers ---
+_indexer = None
+_indexer_lock = threading.Lock()
+
+def get_indexer() -> FaissIndexer:
+    """Reads the index from disk on first use instead of at import time."""
+    global _indexer
+    if _indexer is None:
+        with _indexer_lock:
+            if _indexer is None:
+                _indexer = FaissIndexer()
+    return _indexer
+
+def is_ready() -> bool:
+    return _indexer is not None
+
+def _collect_metrics():
+    """Index gauges for /metrics; empty until the index has been loaded (a scrape never loads it)."""
+    if _indexer is None:
+        return []
+    snapshot = _indexer._snapshot
+    return [
+        ("faiss_vectors", "gauge", "Live vectors in the index.", [({}, _indexer.ntotal)]),
+        ("faiss_delta_vectors", "gauge", "Vectors added since the last snapshot.", [({}, snapshot.delta.ntotal)]),
+        ("faiss_index_info", "gauge", "Type of the index being served.", [({"type": snapshot.index_type}, 1)]),
+        ("faiss_index_version", "gauge", "Bumped whenever the index contents change.", [({}, snapshot.version)]),
+    ]
+
+metrics.register_collector(_collect_metrics)
+
+def index_version():
+    """
+    Changes every time vectors are added or removed; used to invalidate result caches.
+    None until the index is loaded: it never loads it, so it does no I/O on the event loop.
+    """
+    return _indexer.version if _indexer is not None else None
 
 def add_to_index(vectors, metadata):
     """Public API for adding to the shared indexer."""
     if not vectors:  # nothing to add
-        print("⚠️ Skipping empty vectors batch")
-        return
+        logger.warning("Skipping empty vectors batch")
+        return None
 
     vector_arr = np.array(vectors, dtype="float32")
     if vector_arr.ndim == 1:
         vector_arr = vector_arr.reshape(1, -1)
 
-    if vector_arr.shape[1] != _indexer.embedding_dim:
+    faiss_indexer = get_indexer()
+    if vector_arr.shape[1] != faiss_indexer.embedding_dim:
         raise ValueError(
             f"Embedding dimension mismatch: got {vector_arr.shape[1]}, "
-            f"expected {_indexer.embedding_dim}"
+            f"expected {faiss_indexer.embedding_dim}"
         )
 
-    _indexer.add(vector_arr, metadata)
-    _indexer.save()
+    id_range = faiss_indexer.add(vector_arr, metadata)
+    faiss_indexer.maybe_compact()
+    return id_range
 
-def search(query_vec, top_k=3):
-    """Public API for searching the shared indexer, returns structured results."""
-    query_arr = np.array([query_vec], dtype="float32")
-    raw_results = _indexer.search(query_arr, top_k=top_k)
+def remove_from_index(id_ranges):
+    """Public API for removing a document's vectors from the shared indexer."""
+    if not id_ranges:
+        return
+    faiss_indexer = get_indexer()
+    faiss_indexer.remove(id_ranges)
+    faiss_indexer.maybe_compact()
 
-    # Transform raw metadata into desired format
+def _structure(raw_results):
+    """Transform raw metadata into the format returned by the API."""
     structured_results = []
     for item in raw_results:
         # Ensure the metadata dict has the required keys
         structured_results.append({
+            "ID": item.get("id"),
             "Header": item.get("header", ""),
             "Page": item.get("page", -1),
             "PDF_Name": item.get("pdf", ""),
-            "Content": item.get("text", "")
+            "Content": item.get("text", ""),
+            "Score": round(item.get("score", 0.0), 4),
         })
     return structured_results
 
+def search(query_vec, top_k=3, min_score=None, search_filter=None):
+    """Public API for searching the shared indexer, returns structured results."""
+    query_arr = np.array([query_vec], dtype="float32")
+    raw_results = get_indexer().search(query_arr, top_k=top_k, min_score=min_score, search_filter=search_filter)
+    return _structure(raw_results)
+
+def search_many(query_vecs, top_ks, min_scores=None, search_filter=None):
+    """
+    Batched variant of search(): one index.search for all queries (sharing one filter) at the
+    largest top_k, each result list is then trimmed to its own top_k and min_score.
+    """
+    if not query_vecs:
+        return []
+    min_scores = min_scores or [None] * len(query_vecs)
+    query_arr = np.array(query_vecs, dtype="float32")
+    raw_batches = get_indexer().search_batch(query_arr, top_k=max(top_ks), search_filter=search_filter)
+    return [
+        _structure([r for r in raw[:k] if min_score is None or r["score"] >= min_score])
+        for raw, k, min_score in zip(raw_batches, top_ks, min_scores)
+    ]
+
+def lexical_search(query, top_k=3, search_filter=None):
+    """Public API for BM25 keyword search, returns structured results."""
+    return _structure(get_indexer().lexical_search(query, top_k=top_k, search_filter=search_filter))
+
+def fuse_rrf(result_lists, top_k=3, k=60):
+    """
+    Reciprocal rank fusion of several ranked result lists (structured results, matched on "ID"):
+    each section scores sum(1 / (k + rank)) over the lists it appears in. Scores from the
+    individual rankers are not comparable, so only ranks are used; "Score" becomes the fused score.
+    """
+    fused, best = {}, {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            fused[result["ID"]] = fused.get(result["ID"], 0.0) + 1.0 / (k + rank)
+            best.setdefault(result["ID"], result)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [dict(best[i], Score=round(fused[i], 6)) for i in ranked]
@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Tuple
+from . import pdf_reader, sectionizer, embedder, indexer, metrics
+from .manifest import _manifest, file_digest
+
+# --- Configuration ---
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Documents with at least this many pages are sectionized and embedded as a stream
+STREAMING_PAGE_THRESHOLD = int(os.getenv("STREAMING_PAGE_THRESHOLD", "500"))
+
+# Documents currently being processed, keyed by (corpus generation, file name, content hash).
+# A second job asking for the same document waits for the first one instead of indexing it twice.
+_inflight = {}
+_inflight_lock = threading.Lock()
+# Serializes "remove old vectors -> add new vectors -> record in manifest", and corpus resets
+_commit_lock = threading.Lock()
+# Bumped by reset_corpus(); jobs started in an older generation drop their results
+_generation = 0
+
+class IngestCancelled(Exception):
+    """The corpus was reset while the job ran; nothing it produced was kept."""
+
+def current_generation() -> int:
+    return _generation
+
+def reset_corpus():
+    """
+    Empties the index and the manifest. Jobs still running (or queued) from before the reset
+    keep going until their next commit point, then stop without writing anything.
+    """
+    global _generation
+    with _commit_lock:
+        _generation += 1
+        indexer.get_indexer().reset()
+        _manifest.clear()
+
+def _check_generation(generation: int):
+    """Raises IngestCancelled if the corpus was reset since `generation`. Caller holds _commit_lock."""
+    if generation != _generation:
+        raise IngestCancelled("The corpus was reset while this job was running.")
+
+# --- Parse stage (process pool) ---
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Lazily creates the shared process pool. 'spawn' keeps torch/faiss threads out of the children."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+def _timed_parse(pdf_path: str):
+    """parse_pdf() plus its duration, measured where it runs (in the worker process)."""
+    start = time.perf_counter()
+    sections, page_count = sectionizer.parse_pdf(pdf_path)
+    return sections, page_count, time.perf_counter() - start
+
+def _parse_all(pdf_paths: List[Path]):
+    """Yields (pdf_path, sections, page_count) as documents finish parsing, one document per worker."""
+    if len(pdf_paths) == 1 or PARSE_WORKERS <= 1:
+        parsed = ((p, _timed_parse(str(p))) for p in pdf_paths)
+    else:
+        pool = _get_parse_pool()
+        futures = {pool.submit(_timed_parse, str(p)): p for p in pdf_paths}
+        parsed = ((futures[future], future.result()) for future in as_completed(futures))
+
+    for pdf_path, (sections, page_count, seconds) in parsed:
+        metrics.PDF_PARSE_SECONDS.observe(seconds)
+        metrics.PDF_SECTIONS.observe(len(sections))
+        yield pdf_path, sections, page_count
+
+# --- Ingestion ---
+def _claim(pdf_paths: List[Path], generation: int) -> Tuple[List[Tuple[Path, str]], list]:
+    """
+    Splits documents into those this caller must index (claimed) and in-flight ones owned by
+    another job (returned as events to wait on). Files already indexed with the same content are dropped.
+    """
+    claimed, waits = [], []
+    # Hash everything first: a file that cannot be read fails the job before anything is claimed
+    for pdf_path, digest in [(p, file_digest(p)) for p in pdf_paths]:
+        with _inflight_lock:
+            key = (generation, pdf_path.name, digest)
+            done = _inflight.get(key)
+            if done is not None:
+                waits.append(done)
+            elif not _manifest.is_current(pdf_path.name, digest):
+                _inflight[key] = threading.Event()
+                claimed.append((pdf_path, digest))
+    return claimed, waits
+
+def _release(claimed: List[Tuple[Path, str]], generation: int):
+    with _inflight_lock:
+        for pdf_path, digest in claimed:
+            done = _inflight.pop((generation, pdf_path.name, digest), None)
+            if done is not None:
+                done.set()
+
+def _drop_previous_version(pdf_path: Path):
+    """Same file name with different content: drop the old vectors first."""
+    previous = _manifest.get(pdf_path.name)
+    if previous is not None:
+        indexer.remove_from_index(previous["vector_ids"])
+        _manifest.remove(pdf_path.name)
+
+def _commit(pdf_path: Path, digest: str, vectors: list, metadata: list, generation: int):
+    with _commit_lock:
+        _check_generation(generation)
+        _drop_previous_version(pdf_path)
+        id_range = indexer.add_to_index(vectors, metadata)
+        _manifest.record(pdf_path.name, digest, len(metadata), [id_range] if id_range else [])
+
+def _ingest_streaming(pdf_path: Path, digest: str, generation: int, job=None):
+    """
+    Sections of a very large PDF go to the embedder and the index chunk by chunk, so peak
+    memory does not depend on the document length. The document may end up with several ID ranges.
+    If the document fails halfway, the chunks already indexed are removed again.
+    """
+    with _commit_lock:
+        _check_generation(generation)
+        _drop_previous_version(pdf_path)
+
+    id_ranges, section_count = [], 0
+    try:
+        sections = sectionizer.iter_sections(str(pdf_path))
+        for vectors, metadata in embedder.embed_section_stream(sections):
+            with _commit_lock:
+                _check_generation(generation)
+                id_range = indexer.add_to_index(vectors, metadata)
+            if id_range:
+                id_ranges.append(id_range)
+            section_count += len(metadata)
+            if job is not None:
+                job.advance(sections=len(metadata), vectors=len(vectors))
+
+        # Parsing is interleaved with embedding here, so only the section count is recorded
+        metrics.PDF_SECTIONS.observe(section_count)
+        if job is not None:
+            job.advance(pages=pdf_reader.page_count(pdf_path))
+        with _commit_lock:
+            _check_generation(generation)
+            _manifest.record(pdf_path.name, digest, section_count, id_ranges)
+    except Exception:
+        # No manifest entry points at these vectors yet. After a reset their IDs belong to the new corpus.
+        with _commit_lock:
+            if id_ranges and generation == _generation:
+                indexer.remove_from_index(id_ranges)
+        raise
+
+def ingest_pdfs(pdf_paths: List[Path], job=None, generation: int = None) -> int:
+    """
+    Index every PDF that is not in the manifest yet, or whose content changed since.
+    Documents are parsed in parallel on a process pool, then all their sections go through
+    a single batched embedding pass. Runs synchronously (call it from a worker thread).
+    Returns the number of documents that were (re)indexed. Raises IngestCancelled if the corpus
+    is reset after `generation` (default: the current one), e.g. by a bulk upload.
+    """
+    generation = _generation if generation is None else generation
+    claimed, waits = [], []
+    try:
+        claimed, waits = _claim([Path(p) for p in pdf_paths], generation)
+        streamed = [(p, d) for p, d in claimed if pdf_reader.page_count(p) >= STREAMING_PAGE_THRESHOLD]
+        for pdf_path, digest in streamed:
+            _ingest_streaming(pdf_path, digest, generation, job)
+        batched = [(p, d) for p, d in claimed if (p, d) not in streamed]
+
+        all_sections = []
+        for pdf_path, sections, page_count in _parse_all([p for p, _ in batched]):
+            all_sections.extend(sections)
+            if job is not None:
+                job.advance(pages=page_count, sections=len(sections))
+
+        vectors, metadata = embedder.embed_sections(all_sections)
+
+        # Split the batch back per document so each one gets its own ID range
+        by_pdf = defaultdict(list)
+        for i, meta in enumerate(metadata):
+            by_pdf[str(meta["pdf"])].append(i)
+        for pdf_path, digest in batched:
+            rows = by_pdf.get(str(pdf_path), [])
+            _commit(pdf_path, digest, [vectors[i] for i in rows], [metadata[i] for i in rows], generation)
+            if job is not None:
+                job.advance(vectors=len(rows))
+    except Exception as e:
+        # The reset may also have deleted files this job was still reading
+        if generation != _generation and not isinstance(e, IngestCancelled):
+            raise IngestCancelled("The corpus was reset while this job was running.") from e
+        raise
+    finally:
+        _release(claimed, generation)
+
+    for done in waits:
+        done.wait()
+    return len(claimed)
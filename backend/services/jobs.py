@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from . import metrics
+from .ingestion import IngestCancelled, current_generation, ingest_pdfs
+
+# --- Configuration ---
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+MAX_FINISHED_JOBS = 200  # finished jobs kept around for status queries
+
+class IngestJob:
+    """Progress of one ingestion request (one or more PDFs)."""
+    def __init__(self, pdf_paths: List[Path]):
+        self.id = uuid.uuid4().hex
+        self.pdf_paths = [Path(p) for p in pdf_paths]
+        self.generation = current_generation()  # corpus the job was submitted against
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.documents_done = 0
+        self.documents_skipped = 0
+        self.pages = 0
+        self.sections = 0
+        self.vectors = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def advance(self, pages: int = 0, sections: int = 0, vectors: int = 0):
+        with self._lock:
+            self.pages += pages
+            self.sections += sections
+            self.vectors += vectors
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "documents_total": len(self.pdf_paths),
+                "documents_done": self.documents_done,
+                "documents_skipped": self.documents_skipped,
+                "pages": self.pages,
+                "sections": self.sections,
+                "vectors": self.vectors,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+class JobManager:
+    """Runs ingestion jobs on a bounded thread pool, off the event loop."""
+    def __init__(self, max_workers: int = INGEST_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.jobs: Dict[str, IngestJob] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, pdf_paths: List[Path]) -> IngestJob:
+        job = IngestJob(pdf_paths)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda j: j.finished_at)
+            for j in finished[: len(finished) - MAX_FINISHED_JOBS]:
+                del self.jobs[j.id]
+
+    def _run(self, job: IngestJob):
+        job.status = "running"
+        try:
+            job.documents_done = ingest_pdfs(job.pdf_paths, job=job, generation=job.generation)
+            job.documents_skipped = len(job.pdf_paths) - job.documents_done
+            job.status = "completed"
+        except IngestCancelled as e:
+            job.status = "cancelled"
+            job.error = str(e)
+        except Exception as e:
+            print(f"Ingest job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            metrics.INGEST_JOBS.inc(status=job.status)
+            metrics.INGEST_DOCUMENTS.inc(job.documents_done, result="ingested")
+            metrics.INGEST_DOCUMENTS.inc(job.documents_skipped, result="skipped")
+
+# --- Singleton instance ---
+_jobs = JobManager()
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from . import metrics
+
+# --- Configuration ---
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")  # gemini | fake
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+# Base URL of the Gemini REST API; point it at a local fake LLM server for tests and benchmarks
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "https://generativelanguage.googleapis.com").rstrip("/")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds, per call
+# Connection pool shared by every LLM call in this process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+# Simulated latency of the fake backend
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "50"))
+
+if LLM_PROVIDER == "gemini" and not GEMINI_API_KEY:
+    raise ValueError("GEMINI_API_KEY environment variable is not set!")
+
+class LLMError(RuntimeError):
+    """An LLM call failed (HTTP error, timeout or a response without text)."""
+
+class LLMResponse:
+    __slots__ = ("text", "prompt_tokens", "output_tokens")
+
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+
+class LLMMetrics:
+    """Per-call latency (recent window) and token totals, thread-safe."""
+    def __init__(self, window: int = 1024):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, seconds: float, response: Optional[LLMResponse] = None):
+        metrics.LLM_CALL_SECONDS.observe(seconds, outcome="error" if response is None else "ok")
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(seconds)
+            if response is None:
+                self.errors += 1
+            else:
+                self.prompt_tokens += response.prompt_tokens
+                self.output_tokens += response.output_tokens
+        if response is not None:
+            metrics.LLM_TOKENS.inc(response.prompt_tokens, kind="prompt")
+            metrics.LLM_TOKENS.inc(response.output_tokens, kind="output")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+            }
+        if latencies:
+            pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+            stats.update(latency_ms_p50=pick(0.5), latency_ms_p95=pick(0.95), latency_ms_max=pick(1.0))
+        return stats
+
+# --- Backends ---
+class GeminiBackend:
+    """
+    Gemini over its REST API with long-lived httpx clients: connections are pooled and kept
+    alive across calls instead of being set up per request. The async client belongs to the
+    event loop that created it and is replaced (and closed on its own loop) if called from
+    another loop. Its connections can only be closed while that loop is open: whoever ends a
+    loop that made calls awaits aclose() first (the app on shutdown, benchmarks after each run).
+    """
+    name = "gemini"
+
+    def __init__(self, endpoint: str = GEMINI_API_ENDPOINT, api_key: str = GEMINI_API_KEY):
+        self.endpoint = endpoint
+        self.headers = {"x-goog-api-key": api_key or "", "Content-Type": "application/json"}
+        self.limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        )
+        self._client = httpx.Client(headers=self.headers, limits=self.limits)
+        self._async_client = None
+        self._async_loop = None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._close_async_client()
+            self._async_client = httpx.AsyncClient(headers=self.headers, limits=self.limits)
+            self._async_loop = loop
+        return self._async_client
+
+    def _close_async_client(self):
+        """Schedules aclose() of the current async client on its loop, unless that loop is closed already."""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = self._async_loop = None
+        if client is not None and not client.is_closed and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    async def aclose(self):
+        """Closes the pooled async connections; the next async call opens a new client."""
+        if self._async_loop is asyncio.get_running_loop():
+            client, self._async_client, self._async_loop = self._async_client, None, None
+            await client.aclose()
+        else:
+            self._close_async_client()
+
+    def _url(self, model: str, method: str = "generateContent") -> str:
+        return f"{self.endpoint}/v1beta/models/{model}:{method}"
+
+    @staticmethod
+    def _body(prompt: str) -> Dict:
+        return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    @classmethod
+    def _parse(cls, response: httpx.Response) -> LLMResponse:
+        if response.status_code != 200:
+            raise LLMError(f"Gemini API returned HTTP {response.status_code}: {response.text[:300]}")
+        return cls._from_payload(response.json())
+
+    @staticmethod
+    def _from_payload(payload: Dict) -> LLMResponse:
+        try:
+            parts = payload["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError):
+            raise LLMError(f"Gemini API returned no text: {str(payload)[:300]}")
+        usage = payload.get("usageMetadata", {})
+        return LLMResponse(
+            "".join(part.get("text", "") for part in parts),
+            usage.get("promptTokenCount", 0),
+            usage.get("candidatesTokenCount", 0),
+        )
+
+    def generate(self, prompt: str, model: str, timeout: float) -> LLMResponse:
+        return self._parse(self._client.post(self._url(model), json=self._body(prompt), timeout=timeout))
+
+    async def agenerate(self, prompt: str, model: str, timeout: float) -> LLMResponse:
+        client = self._get_async_client()
+        return self._parse(await client.post(self._url(model), json=self._body(prompt), timeout=timeout))
+
+    async def astream(self, prompt: str, model: str, timeout: float) -> AsyncIterator[LLMResponse]:
+        """streamGenerateContent over server-sent events; yields one partial response per event."""
+        client = self._get_async_client()
+        url = self._url(model, "streamGenerateContent") + "?alt=sse"
+        async with client.stream("POST", url, json=self._body(prompt), timeout=timeout) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                raise LLMError(f"Gemini API returned HTTP {response.status_code}: {body[:300]}")
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield self._from_payload(json.loads(line[5:]))
+
+class FakeBackend:
+    """
+    Offline stand-in for benchmarks and tests: answers after FAKE_LLM_LATENCY_MS with text derived
+    from the prompt (a two-host script when the prompt asks for one, else a one-line insight).
+    """
+    name = "fake"
+
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS):
+        self.latency = latency_ms / 1000.0
+
+    @staticmethod
+    def respond(prompt: str) -> LLMResponse:
+        # The prompts put the source text between the first and the last "---"
+        source = prompt.split("---", 1)[1].rsplit("---", 1)[0] if prompt.count("---") >= 2 else prompt
+        words = source.split()
+        if "Alex:" in prompt and "Anya:" in prompt:
+            lines = []
+            for i in range(0, max(len(words), 1), 12):
+                chunk = " ".join(words[i:i + 12]) or "Tell me more."
+                lines.append(f"Alex: What about {chunk}?" if len(lines) % 2 == 0 else f"Anya: {chunk}.")
+            text = "\n".join(lines)
+        else:
+            text = "Insight: " + " ".join(words[:12])
+        return LLMResponse(text, len(prompt.split()), len(text.split()))
+
+    def generate(self, prompt: str, model: str, timeout: float) -> LLMResponse:
+        time.sleep(self.latency)
+        return self.respond(prompt)
+
+    async def agenerate(self, prompt: str, model: str, timeout: float) -> LLMResponse:
+        await asyncio.sleep(self.latency)
+        return self.respond(prompt)
+
+    async def astream(self, prompt: str, model: str, timeout: float) -> AsyncIterator[LLMResponse]:
+        """Same text as agenerate(), delivered a few words at a time over the same total latency."""
+        response = self.respond(prompt)
+        words = response.text.split(" ")
+        chunks = [" ".join(words[i:i + 4]) + " " for i in range(0, len(words), 4)]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            yield LLMResponse(chunk, response.prompt_tokens, response.output_tokens)
+
+    async def aclose(self):
+        pass
+
+_BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+def create_backend(name: str = LLM_PROVIDER):
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected {' or '.join(_BACKENDS)})")
+    return _BACKENDS[name]()
+
+# --- Client ---
+class LLMClient:
+    """
+    Shared entry point for LLM calls (insights, podcast scripts). Holds one backend, and with it
+    the pooled connections, for the whole process, and records latency and token usage per call.
+    """
+    def __init__(self, backend=None, model: str = GEMINI_MODEL_NAME):
+        self.backend = backend or create_backend()
+        self.model = model
+        self.metrics = LLMMetrics()
+
+    def generate(self, prompt: str, timeout: float = LLM_TIMEOUT, model: str = None) -> str:
+        start = time.perf_counter()
+        response = None
+        try:
+            with metrics.span("llm.generate"):
+                response = self.backend.generate(prompt, model or self.model, timeout)
+            return response.text.strip()
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        finally:
+            self.metrics.record(time.perf_counter() - start, response)
+
+    async def agenerate(self, prompt: str, timeout: float = LLM_TIMEOUT, model: str = None) -> str:
+        start = time.perf_counter()
+        response = None
+        try:
+            with metrics.span("llm.generate"):
+                response = await self.backend.agenerate(prompt, model or self.model, timeout)
+            return response.text.strip()
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        finally:
+            self.metrics.record(time.perf_counter() - start, response)
+
+    async def astream(self, prompt: str, timeout: float = LLM_TIMEOUT, model: str = None) -> AsyncIterator[str]:
+        """Yields the generated text in pieces as the backend produces them."""
+        start = time.perf_counter()
+        text, prompt_tokens, output_tokens, failed = [], 0, 0, True
+        try:
+            async for chunk in self.backend.astream(prompt, model or self.model, timeout):
+                text.append(chunk.text)
+                # Usage counts are cumulative, the last chunk has the totals
+                prompt_tokens = max(prompt_tokens, chunk.prompt_tokens)
+                output_tokens = max(output_tokens, chunk.output_tokens)
+                yield chunk.text
+            failed = False
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        finally:
+            response = None if failed else LLMResponse("".join(text), prompt_tokens, output_tokens)
+            self.metrics.record(time.perf_counter() - start, response)
+
+    def stats(self) -> Dict:
+        return dict(self.metrics.stats(), backend=self.backend.name, model=self.model)
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+# --- Singleton instance (lazy, thread-safe) ---
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+def set_backend(backend):
+    """Swaps the backend of the shared client, e.g. for a FakeBackend in tests or benchmarks."""
+    global _client
+    with _client_lock:
+        _client = LLMClient(backend)
+
+def stats() -> Dict:
+    return get_client().stats() if _client is not None else {}
+
+async def aclose():
+    """Closes the shared client's connections of the running event loop (call before it ends)."""
+    if _client is not None:
+        await _client.aclose()
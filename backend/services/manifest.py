@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+def file_digest(path, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class IngestManifest:
+    """
+    Tracks which PDFs have already been ingested.
+    Entries are keyed by file name and remember the content hash of that file, the number of
+    sections and the vector ID ranges the document occupies in the index. Files with identical
+    contents under different names are separate documents with vectors of their own, so
+    replacing or removing one never affects the other.
+    """
+    def __init__(self, store_path="store"):
+        self.store_path = Path(store_path)
+        self.path = self.store_path / "manifest.json"
+        self.lock = threading.Lock()
+
+        self.store_path.mkdir(exist_ok=True)
+        self.load()
+
+    def load(self):
+        """Loads the manifest from disk (empty if missing)."""
+        with self.lock:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries: Dict[str, Dict] = json.load(f)
+            else:
+                self.entries = {}
+            # Older manifests were keyed by content hash with the file name inside
+            if any("pdf" in entry for entry in self.entries.values()):
+                self.entries = {
+                    entry["pdf"]: {"digest": digest, "sections": entry["sections"], "vector_ids": entry["vector_ids"]}
+                    for digest, entry in self.entries.items()
+                }
+                self._save()
+
+    def _save(self):
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        temp_path.replace(self.path)
+
+    def get(self, pdf_name: str) -> Optional[Dict]:
+        """The entry of the document currently indexed under this file name."""
+        with self.lock:
+            return self.entries.get(pdf_name)
+
+    def is_current(self, pdf_name: str, digest: str) -> bool:
+        """True when this file name is already indexed with exactly this content."""
+        entry = self.get(pdf_name)
+        return entry is not None and entry["digest"] == digest
+
+    def record(self, pdf_name: str, digest: str, sections: int, vector_ids: List[List[int]]):
+        with self.lock:
+            self.entries[pdf_name] = {
+                "digest": digest,
+                "sections": sections,
+                "vector_ids": vector_ids,
+            }
+            self._save()
+
+    def remove(self, pdf_name: str):
+        with self.lock:
+            if self.entries.pop(pdf_name, None) is not None:
+                self._save()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            if self.path.exists():
+                self.path.unlink()
+
+# --- Singleton instance ---
+_manifest = IngestManifest()
@@ -0,0 +1,204 @@
+import json
+import re
+import sqlite3
+import numpy as np
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Section fields stored in their own columns; anything else goes into the JSON "extra" column
+_COLUMNS = ("pdf", "page", "header", "text")
+# BM25 column weights for the full-text index: a term in a header counts double
+_BM25_WEIGHTS = (2.0, 1.0)
+# Query terms found in more than this share of sections are dropped while rarer terms remain:
+# FTS5 clamps their IDF to ~0, so they barely change the ranking, but bm25() has to score
+# every row they match
+_COMMON_TERM_SHARE = 0.5
+
+class MetadataStore:
+    """
+    Section metadata on disk (SQLite, WAL mode) instead of a pickled list held in memory.
+    Rows are keyed by vector ID, so a search only materializes the rows it actually hit.
+    Each thread gets its own connection; readers never block on the writer.
+
+    Headers and text are also kept in an FTS5 table (same rowid as the vector ID) that is
+    updated in the same transaction as the sections, so the BM25 index grows with every ingest.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sections ("
+                "id INTEGER PRIMARY KEY, pdf TEXT, page INTEGER, header TEXT, text TEXT, extra TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sections_pdf ON sections (pdf, page)")
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+            self.fulltext = self._create_fulltext(conn)
+
+    @staticmethod
+    def _create_fulltext(conn) -> bool:
+        """Creates the FTS5 table (backfilled from existing sections); False if SQLite lacks FTS5."""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sections_fts'").fetchone()
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5("
+                "header, text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable ({e}); lexical and hybrid search are disabled.")
+            return False
+        if not exists:
+            conn.execute("INSERT INTO sections_fts (rowid, header, text) SELECT id, header, text FROM sections")
+        # Per-term document counts, read by match() to skip near-universal terms
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS sections_vocab USING fts5vocab(sections_fts, 'row')")
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: a commit survives power loss. The index publishes snapshots through the state table
+            # and deletes its append log right after, so a lost commit would lose both.
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(vector_id: int, meta: Dict) -> tuple:
+        extra = {k: v for k, v in meta.items() if k not in _COLUMNS}
+        return (
+            vector_id,
+            str(meta.get("pdf", "")),
+            meta.get("page", -1),
+            meta.get("header", ""),
+            meta.get("text", ""),
+            json.dumps(extra, default=str) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row) -> Dict:
+        meta = {"pdf": row[1], "page": row[2], "header": row[3], "text": row[4]}
+        if row[5]:
+            meta.update(json.loads(row[5]))
+        return meta
+
+    def insert(self, start: int, metadata: List[Dict], next_id: Optional[int] = None):
+        """Stores metadata under sequential IDs starting at `start` (and next_id) in one transaction."""
+        self.put_many({start + i: meta for i, meta in enumerate(metadata)}, next_id)
+
+    def put_many(self, items: Dict[int, Dict], next_id: Optional[int] = None):
+        rows = [self._to_row(vector_id, meta) for vector_id, meta in items.items()]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if self.fulltext:
+                conn.executemany("DELETE FROM sections_fts WHERE rowid = ?", ((row[0],) for row in rows))
+                conn.executemany(
+                    "INSERT INTO sections_fts (rowid, header, text) VALUES (?, ?, ?)",
+                    ((row[0], row[3], row[4]) for row in rows),
+                )
+            if next_id is not None:
+                conn.execute("INSERT OR REPLACE INTO state VALUES ('next_id', ?)", (next_id,))
+
+    def delete_ranges(self, id_ranges: Iterable) -> int:
+        count = 0
+        with self._connect() as conn:
+            for start, end in id_ranges:
+                count += conn.execute("DELETE FROM sections WHERE id >= ? AND id < ?", (start, end)).rowcount
+                if self.fulltext:
+                    conn.execute("DELETE FROM sections_fts WHERE rowid >= ? AND rowid < ?", (start, end))
+        return count
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        """Returns {id: metadata} for the given IDs; unknown IDs are left out."""
+        ids = list({int(i) for i in ids if i >= 0})
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._connect().execute(
+            f"SELECT id, pdf, page, header, text, extra FROM sections WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        return {row[0]: self._from_row(row) for row in rows}
+
+    @staticmethod
+    def _filter_clause(pdfs=None, page_from: int = None, page_to: int = None, column_prefix: str = ""):
+        """SQL conditions (joined with AND) and parameters for a PDF / page range filter."""
+        clauses, params = [], []
+        if pdfs:
+            names = []
+            for pdf in pdfs:
+                escaped = pdf.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                names.append(f"({column_prefix}pdf = ? OR {column_prefix}pdf LIKE ? ESCAPE '\\')")
+                params += [pdf, f"%/{escaped}"]
+            clauses.append("(" + " OR ".join(names) + ")")
+        if page_from is not None:
+            clauses.append(f"{column_prefix}page >= ?")
+            params.append(page_from)
+        if page_to is not None:
+            clauses.append(f"{column_prefix}page <= ?")
+            params.append(page_to)
+        return clauses, params
+
+    def ids_matching(self, pdfs=None, page_from: int = None, page_to: int = None) -> np.ndarray:
+        """
+        Vector IDs of the sections in the given PDFs (full stored path or bare file name)
+        and/or page range (inclusive), sorted.
+        """
+        clauses, params = self._filter_clause(pdfs, page_from, page_to)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(f"SELECT id FROM sections{where} ORDER BY id", params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype="int64", count=len(rows))
+
+    def match(self, query: str, limit: int, pdfs=None, page_from: int = None, page_to: int = None) -> List[Tuple[int, float]]:
+        """
+        BM25 full-text lookup: [(id, score)] best first, where score is the negated FTS5 bm25()
+        so that higher is better. Any query term may match; sections matching more (and rarer)
+        terms rank higher. The same filters as ids_matching() are applied in the query.
+        """
+        terms = list(dict.fromkeys(re.findall(r"\w+", query.lower())))
+        if not self.fulltext or not terms or limit <= 0:
+            return []
+        expression = " OR ".join(f'"{term}"' for term in self._selective_terms(terms))
+        clauses, params = self._filter_clause(pdfs, page_from, page_to, column_prefix="s.")
+        sql = (
+            f"SELECT f.rowid, -bm25(sections_fts, {_BM25_WEIGHTS[0]}, {_BM25_WEIGHTS[1]}) AS score "
+            "FROM sections_fts f"
+        )
+        if clauses:
+            sql += f" JOIN sections s ON s.id = f.rowid WHERE sections_fts MATCH ? AND {' AND '.join(clauses)}"
+        else:
+            sql += " WHERE sections_fts MATCH ?"
+        sql += " ORDER BY score DESC LIMIT ?"
+        rows = self._connect().execute(sql, [expression, *params, limit]).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def _selective_terms(self, terms: List[str]) -> List[str]:
+        """The query terms without those matching over _COMMON_TERM_SHARE of the sections, if any other term matches."""
+        if len(terms) < 2:
+            return terms
+        conn = self._connect()
+        placeholders = ",".join("?" * len(terms))
+        counts = dict(conn.execute(f"SELECT term, doc FROM sections_vocab WHERE term IN ({placeholders})", terms))
+        cutoff = self.count() * _COMMON_TERM_SHARE
+        selective = [term for term in terms if counts.get(term, 0) <= cutoff]
+        # Terms missing from the vocabulary match nothing: keep everything unless a kept term matches
+        return selective if any(counts.get(term) for term in selective) else terms
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+
+    def get_state(self, key: str, default: int = 0) -> int:
+        row = self._connect().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value: int):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sections")
+            conn.execute("DELETE FROM state")
+            if self.fulltext:
+                conn.execute("DELETE FROM sections_fts")
@@ -0,0 +1,280 @@
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# --- Configuration ---
+# Histograms and counters for every pipeline stage, served at /metrics; "0" turns recording off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Per-request tracing spans (Server-Timing header + /api/traces); off by default
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))  # most recent traces kept
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_NULL = nullcontext()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+# --- Metric types ---
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_child(key, value))
+        return lines
+
+class Counter(_Metric):
+    """Monotonic count, optionally labelled."""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_child(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Histogram(_Metric):
+    """
+    Bucketed distribution (Prometheus histogram: cumulative buckets, _sum and _count).
+    time() measures a block in seconds and, inside a traced request, records it as a span too.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.span_name = name[: -len("_seconds")] if name.endswith("_seconds") else name
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                child = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def time(self, **labels):
+        trace = _current_trace.get() if TRACING_ENABLED else None
+        if not METRICS_ENABLED and trace is None:
+            return _NULL
+        return _Timer(self.span_name, trace, self if METRICS_ENABLED else None, labels)
+
+    def _render_child(self, key, child):
+        counts, total, count = child
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(round(total, 6))}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CacheCounter:
+    """Hit/miss tally for caches that have no counters of their own (same stats() keys as LRUCache)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+# --- Registry ---
+_registry: List[_Metric] = []
+_collectors: List[Callable] = []
+_caches: Dict[str, object] = {}
+
+def register_collector(collect: Callable):
+    """
+    Adds values computed at scrape time (gauges: index size, ...). collect() returns
+    (name, type, help, [(labels dict, value), ...]) tuples; a failing collector is skipped.
+    """
+    _collectors.append(collect)
+
+def register_cache(name: str, cache):
+    """Exports hits, misses and hit ratio of a cache with a stats() dict (LRUCache, PersistentCache, CacheCounter)."""
+    _caches[name] = cache
+
+def _collect_caches():
+    stats = {name: cache.stats() for name, cache in list(_caches.items())}
+    return [
+        ("cache_hits_total", "counter", "Cache lookups that hit.",
+         [({"cache": name}, s["hits"]) for name, s in stats.items()]),
+        ("cache_misses_total", "counter", "Cache lookups that missed.",
+         [({"cache": name}, s["misses"]) for name, s in stats.items()]),
+        ("cache_hit_ratio", "gauge", "Hits / lookups since start.",
+         [({"cache": name}, round(s["hit_rate"], 4)) for name, s in stats.items()]),
+        ("cache_entries", "gauge", "Entries currently cached.",
+         [({"cache": name}, s["size"]) for name, s in stats.items() if "size" in s]),
+    ]
+
+register_collector(_collect_caches)
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    for collect in list(_collectors):
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+            continue
+        for name, type, help, samples in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- Pipeline metrics ---
+PDF_PARSE_SECONDS = Histogram("pdf_parse_seconds", "Time to parse and sectionize one PDF.")
+PDF_SECTIONS = Histogram("pdf_sections_per_document", "Sections found per ingested PDF.", buckets=SIZE_BUCKETS)
+EMBED_BATCH_SECONDS = Histogram("embed_batch_seconds", "Time to encode one batch of texts.", ["backend"])
+EMBED_BATCH_SIZE = Histogram("embed_batch_size", "Texts per encoded batch.", ["backend"], buckets=SIZE_BUCKETS)
+FAISS_SEARCH_SECONDS = Histogram("faiss_search_seconds", "FAISS search of one query batch.", ["index_type"])
+FAISS_ADD_SECONDS = Histogram("faiss_add_seconds", "Adding one batch of vectors to the index.")
+FAISS_SAVE_SECONDS = Histogram("faiss_save_seconds", "Index compaction/save to disk.", ["rebuild"])
+LLM_CALL_SECONDS = Histogram("llm_call_seconds", "LLM call latency (to the last token when streaming).", ["outcome"])
+TTS_CALL_SECONDS = Histogram("tts_call_seconds", "Speech synthesis of one podcast turn.", ["outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens sent to and generated by the LLM.", ["kind"])
+FAISS_VECTORS = Counter("faiss_vectors_total", "Vectors added to or removed from the index.", ["op"])
+FAISS_REPLAYED = Counter("faiss_log_replayed_total", "Logged index changes replayed at startup.")
+INGEST_JOBS = Counter("ingest_jobs_total", "Finished ingestion jobs.", ["status"])
+INGEST_DOCUMENTS = Counter("ingest_documents_total", "PDFs handled by ingestion jobs.", ["result"])
+PODCAST_EVICTIONS = Counter("podcast_cache_evictions_total", "Cached podcasts deleted to stay within the size limit.")
+
+# --- Tracing ---
+class Trace:
+    __slots__ = ("method", "path", "start", "spans")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.spans = []  # (name, offset seconds, duration seconds)
+
+    def to_dict(self, total: float) -> Dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(total * 1000, 2),
+            "spans": [
+                {"name": name, "start_ms": round(offset * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+                for name, offset, duration in self.spans
+            ],
+        }
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+
+class _Timer:
+    __slots__ = ("name", "trace", "histogram", "labels", "start")
+
+    def __init__(self, name, trace, histogram=None, labels=None):
+        self.name = name
+        self.trace = trace
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        if self.histogram is not None:
+            self.histogram.observe(duration, **self.labels)
+        if self.trace is not None:
+            self.trace.spans.append((self.name, self.start - self.trace.start, duration))
+
+def span(name: str):
+    """Records the block as a span of the current request's trace; a no-op when not tracing."""
+    trace = _current_trace.get() if TRACING_ENABLED else None
+    return _Timer(name, trace) if trace is not None else _NULL
+
+def recent_traces() -> List[Dict]:
+    return list(_traces)
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a trace per HTTP request. Spans recorded while the response
+    headers are still pending go into a Server-Timing header (shown by browser dev tools);
+    the full trace is kept in a ring buffer once the response is complete.
+    Work moved to threads with asyncio.to_thread() keeps the request's trace; work batched
+    across requests (e.g. the search batcher) lands in one request's trace or none.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = Trace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = ", ".join(
+                    f"{name.replace('.', '-')};dur={duration * 1000:.2f}" for name, _, duration in trace.spans
+                )
+                if timing:
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            _traces.append(trace.to_dict(time.perf_counter() - trace.start))
@@ -1,5 +1,6 @@
 import fitz
 import re
+from array import array
 from collections import defaultdict
 from statistics import median, stdev, StatisticsError
 
@@ -33,97 +34,148 @@ def extract_text(pdf_path):
     doc = fitz.open(str(pdf_path))
     return [page.get_text() for page in doc]
 
-def extract_headings_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    lines_data, all_font_sizes = [], []
-    header_footer_counts = defaultdict(int)
+# --- Single-pass layout extraction ---
+LINE_BOLD = 1  # bit in PageLayout.line_flags
 
-    # 1. Gather spans + detect header/footer
-    for page_num, page in enumerate(doc):
-        page_height = page.rect.height
-        blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT)["blocks"]
+class PageLayout:
+    """
+    Compact layout of one page, built from a single get_text("dict") call.
+    Lines (heading candidates, >= 3 chars) and text blocks are stored as parallel arrays;
+    bboxes are flattened (x0, y0, x1, y1) per record.
+    """
+    __slots__ = ("number", "height", "line_text", "line_bbox", "line_size", "line_flags",
+                 "block_text", "block_bbox")
 
-        for block in blocks:
-            if block["type"] != 0:  # not text
-                continue
-            for line in block["lines"]:
-                text = " ".join(s["text"].strip() for s in line["spans"]).strip()
-                if not text or len(text) < 3:
-                    continue
+    def __init__(self, number: int, height: float):
+        self.number = number  # 1-based
+        self.height = height
+        self.line_text = []
+        self.line_bbox = array("d")
+        self.line_size = array("d")
+        self.line_flags = array("B")
+        self.block_text = []
+        self.block_bbox = array("d")
 
-                lines_data.append({
-                    "text": text,
-                    "size": line["spans"][0]["size"],
-                    "spans": line["spans"],
-                    "bbox": line["bbox"],
-                    "page": page_num + 1,
-                })
-                all_font_sizes.extend(s["size"] for s in line["spans"])
+    def line_count(self) -> int:
+        return len(self.line_text)
 
-                # header/footer candidates
-                if line["bbox"][1] < page_height * HEADER_FOOTER_MARGIN or \
-                   line["bbox"][3] > page_height * (1 - HEADER_FOOTER_MARGIN):
-                    header_footer_counts[normalize_text(text)] += 1
+    def block_count(self) -> int:
+        return len(self.block_text)
 
-    if not all_font_sizes:
-        return []
+    def bbox(self, i: int, blocks: bool = False) -> tuple:
+        arr = self.block_bbox if blocks else self.line_bbox
+        return tuple(arr[4 * i: 4 * i + 4])
 
-    # 2. Compute adaptive thresholds
-    try:
-        body_font = median(all_font_sizes)
-        font_dev = stdev(all_font_sizes) if len(all_font_sizes) > 1 else 0
-    except StatisticsError:
-        body_font, font_dev = (sum(all_font_sizes) / len(all_font_sizes)), 0
+class DocumentLayout:
+    __slots__ = ("page_count", "pages", "font_sizes")
 
-    font_size_threshold = body_font * (1.1 + (font_dev / body_font if body_font > 0 else 0))
-    rep_threshold = doc.page_count * REPETITION_THRESHOLD_RATIO
-    suppression_list = {
-        t for t, c in header_footer_counts.items() if c >= rep_threshold and len(t.split()) < 10
-    }
+    def __init__(self, page_count: int):
+        self.page_count = page_count
+        self.pages = []
+        self.font_sizes = array("d")  # span sizes of every candidate line
 
-    # 3. Score lines
-    scored = []
-    for line in lines_data:
-        text = line["text"]
-        norm = normalize_text(text)
+def extract_page_layout(page, page_number: int, font_sizes=None) -> PageLayout:
+    layout = PageLayout(page_number, page.rect.height)
+    blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT)["blocks"]
 
-        if norm in suppression_list or is_toc_entry(text) or is_caption(text):
+    for block in blocks:
+        if block["type"] != 0:  # not text
             continue
+        # Same text get_text("blocks") would give: spans concatenated, lines joined
+        block_text = "\n".join("".join(s["text"] for s in line["spans"]) for line in block["lines"])
+        block_text = block_text.strip().replace("\n", " ")
+        if block_text:
+            layout.block_text.append(block_text)
+            layout.block_bbox.extend(block["bbox"])
 
-        score = 0
-        if line["size"] > font_size_threshold: score += 2
-        if any(is_bold(s) for s in line["spans"]): score += 1
-        if text.isupper(): score += 1
-        elif text.istitle(): score += 0.5
-        if starts_with_numbering(text): score += 1
-        if len(text.split()) < 10: score += 0.5
-        if text.endswith(('.', '?', '!')): score -= 1
-        elif text.endswith(':'): score += 0.5
-
-        if score > 0:
-            line["score"] = score
-            scored.append(line)
-
-    if not scored:
-        return []
+        for line in block["lines"]:
+            text = " ".join(s["text"].strip() for s in line["spans"]).strip()
+            if not text or len(text) < 3:
+                continue
+            layout.line_text.append(text)
+            layout.line_bbox.extend(line["bbox"])
+            layout.line_size.append(line["spans"][0]["size"])
+            layout.line_flags.append(LINE_BOLD if any(is_bold(s) for s in line["spans"]) else 0)
+            if font_sizes is not None:
+                font_sizes.extend(s["size"] for s in line["spans"])
+    return layout
 
-    # 4. Filter & remove TOC-like pages
-    potential = [l for l in scored if l["score"] >= 1.5]
-    if not potential:
-        return []
+def extract_layout(pdf_path) -> DocumentLayout:
+    """Opens the PDF once and extracts the compact layout of every page."""
+    with fitz.open(str(pdf_path)) as doc:
+        layout = DocumentLayout(doc.page_count)
+        for page_num, page in enumerate(doc, 1):
+            layout.pages.append(extract_page_layout(page, page_num, layout.font_sizes))
+    return layout
+
+def iter_page_layouts(pdf_path, font_sizes=None):
+    """Yields the layout of one page at a time, so memory does not grow with the document."""
+    with fitz.open(str(pdf_path)) as doc:
+        for page_num, page in enumerate(doc, 1):
+            yield extract_page_layout(page, page_num, font_sizes)
+
+def page_count(pdf_path) -> int:
+    with fitz.open(str(pdf_path)) as doc:
+        return doc.page_count
+
+# --- Heading detection ---
+def _count_header_footer(page: PageLayout, counts):
+    page_height, bboxes = page.height, page.line_bbox
+    for i in range(page.line_count()):
+        if bboxes[4 * i + 1] < page_height * HEADER_FOOTER_MARGIN or \
+           bboxes[4 * i + 3] > page_height * (1 - HEADER_FOOTER_MARGIN):
+            counts[normalize_text(page.line_text[i])] += 1
+
+def _base_score(text: str, bold: bool) -> float:
+    """Heading score of a line, without the font-size bonus."""
+    score = 0
+    if bold: score += 1
+    if text.isupper(): score += 1
+    elif text.istitle(): score += 0.5
+    if starts_with_numbering(text): score += 1
+    if len(text.split()) < 10: score += 0.5
+    if text.endswith(('.', '?', '!')): score -= 1
+    elif text.endswith(':'): score += 0.5
+    return score
+
+def _toc_threshold(potential_count: int, page_count: int) -> float:
+    avg_per_page = potential_count / page_count
+    return max(8, avg_per_page * 4)
+
+class HeadingRules:
+    """Document-wide thresholds used to score heading candidates page by page."""
+    def __init__(self, body_font: float, font_dev: float, header_footer_counts, page_count: int):
+        self.font_size_threshold = body_font * (1.1 + (font_dev / body_font if body_font > 0 else 0))
+        rep_threshold = page_count * REPETITION_THRESHOLD_RATIO
+        self.suppression_list = {
+            t for t, c in header_footer_counts.items() if c >= rep_threshold and len(t.split()) < 10
+        }
 
-    avg_per_page = len(potential) / doc.page_count
-    toc_threshold = max(8, avg_per_page * 4)
-    page_counts = defaultdict(int)
-    for l in potential:
-        page_counts[l["page"]] += 1
-    toc_pages = {p for p, c in page_counts.items() if c > toc_threshold}
+    def page_candidates(self, page: PageLayout) -> list:
+        """Lines of one page that score as potential headings."""
+        potential = []
+        for i in range(page.line_count()):
+            text = page.line_text[i]
+            norm = normalize_text(text)
 
-    headings = [l for l in potential if l["page"] not in toc_pages and len(l["text"]) < 200]
+            if norm in self.suppression_list or is_toc_entry(text) or is_caption(text):
+                continue
+
+            score = _base_score(text, page.line_flags[i] & LINE_BOLD)
+            if page.line_size[i] > self.font_size_threshold: score += 2
+
+            if score >= 1.5:
+                potential.append({"text": text, "bbox": page.bbox(i), "page": page.number, "score": score})
+        return potential
+
+def _select_page_headings(potential: list, toc_threshold: float) -> list:
+    """Drops TOC-like pages and overlong lines, then merges multi-line headings of one page."""
+    if len(potential) > toc_threshold:
+        return []
+    headings = [l for l in potential if len(l["text"]) < 200]
 
-    # 5. Merge multi-line headings
     merged, used = [], set()
-    headings.sort(key=lambda x: (x["page"], x["bbox"][1]))
+    headings.sort(key=lambda x: x["bbox"][1])
     for i, h in enumerate(headings):
         if i in used:
             continue
@@ -131,12 +183,126 @@ def extract_headings_from_pdf(pdf_path):
         bbox = list(h["bbox"]) 
         for j in range(i + 1, len(headings)):
             nxt = headings[j]
-            if nxt["page"] == current["page"] and abs(nxt["bbox"][1] - current["bbox"][3]) < 10:
+            if abs(nxt["bbox"][1] - current["bbox"][3]) < 10:
                 text += " " + nxt["text"]
                 used.add(j)
                 current = nxt
             else:
                 break
         merged.append({"text": text, "page": current["page"],"bbox": tuple(bbox)})
+    return merged
+
+def extract_headings_from_pdf(pdf_path):
+    return detect_headings(extract_layout(pdf_path))
+
+def detect_headings(layout: DocumentLayout):
+    all_font_sizes = layout.font_sizes
+    header_footer_counts = defaultdict(int)
+
+    # 1. Detect header/footer
+    for page in layout.pages:
+        _count_header_footer(page, header_footer_counts)
 
+    if not all_font_sizes:
+        return []
+
+    # 2. Compute adaptive thresholds
+    try:
+        body_font = median(all_font_sizes)
+        font_dev = stdev(all_font_sizes) if len(all_font_sizes) > 1 else 0
+    except StatisticsError:
+        body_font, font_dev = (sum(all_font_sizes) / len(all_font_sizes)), 0
+    rules = HeadingRules(body_font, font_dev, header_footer_counts, layout.page_count)
+
+    # 3. Score lines
+    potential = [rules.page_candidates(page) for page in layout.pages]
+    total = sum(len(p) for p in potential)
+    if not total:
+        return []
+
+    # 4. Remove TOC-like pages, 5. merge multi-line headings
+    toc_threshold = _toc_threshold(total, layout.page_count)
+    merged = []
+    for page_potential in potential:
+        merged.extend(_select_page_headings(page_potential, toc_threshold))
     return merged
+
+# --- Streaming heading detection (bounded memory) ---
+class FontStats:
+    """
+    Bounded-memory font size statistics: a 0.1pt histogram for the median and
+    Welford's algorithm for the standard deviation.
+    """
+    BINS_PER_POINT = 10
+
+    def __init__(self):
+        self.histogram = defaultdict(int)
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def append(self, size: float):
+        self.histogram[round(size * self.BINS_PER_POINT)] += 1
+        self.count += 1
+        delta = size - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (size - self._mean)
+
+    def extend(self, sizes):
+        for size in sizes:
+            self.append(size)
+
+    def median(self) -> float:
+        lo_rank, hi_rank = (self.count - 1) // 2, self.count // 2
+        lo = hi = None
+        seen = 0
+        for b, c in sorted(self.histogram.items()):
+            seen += c
+            if lo is None and seen > lo_rank:
+                lo = b
+            if seen > hi_rank:
+                hi = b
+                break
+        return (lo + hi) / 2 / self.BINS_PER_POINT
+
+    def stdev(self) -> float:
+        return (self._m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0
+
+class StreamingHeadingDetector:
+    """
+    Heading detection that never holds more than one page in memory.
+    The constructor streams the document once to collect document-wide statistics
+    (font histogram, header/footer repetitions, an estimate of the candidate count);
+    headings(page) then detects the headings of each page during a second pass.
+    """
+    def __init__(self, pdf_path):
+        fonts = FontStats()
+        header_footer_counts = defaultdict(int)
+        strong = 0  # candidates without the size bonus
+        weak_sizes = defaultdict(int)  # font bin -> lines that are candidates only with the size bonus
+
+        self.page_count = 0
+        for page in iter_page_layouts(pdf_path, fonts):
+            self.page_count += 1
+            _count_header_footer(page, header_footer_counts)
+            for i in range(page.line_count()):
+                text = page.line_text[i]
+                if is_toc_entry(text) or is_caption(text):
+                    continue
+                score = _base_score(text, page.line_flags[i] & LINE_BOLD)
+                if score >= 1.5:
+                    strong += 1
+                elif score >= -0.5:
+                    weak_sizes[round(page.line_size[i] * FontStats.BINS_PER_POINT)] += 1
+
+        self.rules = None
+        if fonts.count:
+            self.rules = HeadingRules(fonts.median(), fonts.stdev(), header_footer_counts, self.page_count)
+            threshold_bin = self.rules.font_size_threshold * FontStats.BINS_PER_POINT
+            estimate = strong + sum(c for b, c in weak_sizes.items() if b > threshold_bin)
+            self.toc_threshold = _toc_threshold(estimate, self.page_count)
+
+    def headings(self, page: PageLayout) -> list:
+        if self.rules is None:
+            return []
+        return _select_page_headings(self.rules.page_candidates(page), self.toc_threshold)
@@ -1,35 +1,55 @@
-from typing import List, Dict, Set, Tuple
-import fitz
-from .pdf_reader import extract_headings_from_pdf
+from bisect import bisect_left
+from typing import Iterator, List, Dict, Optional, Tuple
+from .pdf_reader import extract_layout, detect_headings, iter_page_layouts, StreamingHeadingDetector
 
 HEADING_Y_TOLERANCE = 3
 
+class HeadingIndex:
+    """Per-page, y-sorted heading positions so a block lookup is a bisect instead of a scan."""
+    def __init__(self, headings: List[Dict]):
+        self._pages: Dict[int, Tuple[List[int], List[Dict]]] = {}
+        for h in sorted(headings, key=lambda h: (h["page"], round(h["bbox"][1]))):
+            ys, objs = self._pages.setdefault(h["page"], ([], []))
+            ys.append(round(h["bbox"][1]))
+            objs.append(h)
+
+    def find(self, page: int, y: int, tolerance: int = HEADING_Y_TOLERANCE) -> Optional[Dict]:
+        """Returns the topmost heading on `page` within `tolerance` of `y`, or None."""
+        entry = self._pages.get(page)
+        if entry is None:
+            return None
+        ys, objs = entry
+        i = bisect_left(ys, y - tolerance)
+        if i < len(ys) and ys[i] <= y + tolerance:
+            return objs[i]
+        return None
+
+def _page_blocks(page) -> Iterator[Dict]:
+    order = sorted(range(page.block_count()), key=lambda i: (page.block_bbox[4 * i + 1], page.block_bbox[4 * i]))  # sort by y, x
+    for i in order:
+        yield {
+            "page": page.number,
+            "bbox": page.bbox(i, blocks=True),
+            "text": page.block_text[i]
+        }
+
 def split_into_sections(pdf_path: str) -> List[Dict]:
     """
     Splits a PDF into sections based on extracted headings.
     Returns a list of sections with metadata: pdf, page, header, text.
     Fully robust: works with or without headings, and merges blocks correctly.
     """
-    doc = fitz.open(pdf_path)
-    headings = extract_headings_from_pdf(pdf_path)
+    return sections_from_layout(pdf_path, extract_layout(pdf_path))
 
-    # Map heading positions
-    heading_locations: Set[Tuple[int, int]] = {
-        (h["page"], round(h["bbox"][1])) for h in headings
-    }
+def sections_from_layout(pdf_path: str, layout) -> List[Dict]:
+    """Same as split_into_sections, on an already extracted DocumentLayout."""
+    headings = detect_headings(layout)
+
+    # Index heading positions
+    heading_index = HeadingIndex(headings)
 
     # Gather all text blocks
-    all_blocks = []
-    for page_num, page in enumerate(doc, 1):
-        blocks = sorted(page.get_text("blocks"), key=lambda b: (b[1], b[0]))  # sort by y, x
-        for b in blocks:
-            text = b[4].strip().replace('\n', ' ')
-            if text:
-                all_blocks.append({
-                    "page": page_num,
-                    "bbox": b[:4],
-                    "text": text
-                })
+    all_blocks = [block for page in layout.pages for block in _page_blocks(page)]
 
     # If no headings, return full document as one section
     if not headings:
@@ -46,13 +66,9 @@ def split_into_sections(pdf_path: str) -> List[Dict]:
     current_section_index = None  # points to last section in `sections`
 
     for block in all_blocks:
-        block_location = (block["page"], round(block["bbox"][1]))
-        is_a_heading = any(
-            block_location[0] == loc[0] and abs(block_location[1] - loc[1]) <= HEADING_Y_TOLERANCE
-            for loc in heading_locations
-        )
+        current_heading_obj = heading_index.find(block["page"], round(block["bbox"][1]))
 
-        if is_a_heading:
+        if current_heading_obj is not None:
             # Save previous section's text
             if current_section_index is not None:
                 sections[current_section_index]["text"] = " ".join(current_section_blocks)
@@ -67,10 +83,6 @@ def split_into_sections(pdf_path: str) -> List[Dict]:
                 })
 
             # Start new section
-            current_heading_obj = next(
-                h for h in headings
-                if h["page"] == block_location[0] and abs(round(h["bbox"][1]) - block_location[1]) <= HEADING_Y_TOLERANCE
-            )
             sections.append({
                 "pdf": pdf_path,
                 "page": current_heading_obj["page"],
@@ -95,3 +107,73 @@ def split_into_sections(pdf_path: str) -> List[Dict]:
         })
 
     return sections
+
+def parse_pdf(pdf_path: str) -> Tuple[List[Dict], int]:
+    """
+    Parse stage of ingestion: returns (sections, page_count).
+    Top-level and picklable so it can run in a process pool worker.
+    """
+    layout = extract_layout(pdf_path)
+    return sections_from_layout(pdf_path, layout), layout.page_count
+
+def iter_sections(pdf_path: str) -> Iterator[Dict]:
+    """
+    Streaming version of split_into_sections for very large PDFs.
+    Only one page layout is held at a time and each section is yielded as soon as the next
+    heading closes it. The document is read twice: once for the heading statistics, once
+    to emit sections.
+    """
+    detector = StreamingHeadingDetector(pdf_path)
+    found_headings = False
+    current_section = None
+    current_section_blocks = []
+
+    for page in iter_page_layouts(pdf_path):
+        headings = detector.headings(page)
+        found_headings = found_headings or bool(headings)
+        heading_index = HeadingIndex(headings)
+
+        for block in _page_blocks(page):
+            current_heading_obj = heading_index.find(block["page"], round(block["bbox"][1]))
+            if current_heading_obj is None:
+                current_section_blocks.append(block["text"])
+                continue
+
+            # Emit previous section
+            if current_section is not None:
+                current_section["text"] = " ".join(current_section_blocks)
+                yield current_section
+            elif current_section_blocks:
+                # Text before first heading
+                yield {
+                    "pdf": pdf_path,
+                    "page": 1,
+                    "header": "Introduction" if len(current_section_blocks) > 1 else "Preamble",
+                    "text": " ".join(current_section_blocks)
+                }
+
+            current_section = {
+                "pdf": pdf_path,
+                "page": current_heading_obj["page"],
+                "header": current_heading_obj["text"],
+                "text": ""
+            }
+            current_section_blocks = []
+
+    if current_section is not None:
+        current_section["text"] = " ".join(current_section_blocks)
+        yield current_section
+    elif not found_headings:
+        yield {
+            "pdf": pdf_path,
+            "page": 1,
+            "header": "Full Document",
+            "text": " ".join(current_section_blocks)
+        }
+    elif current_section_blocks:
+        yield {
+            "pdf": pdf_path,
+            "page": 1,
+            "header": "Introduction",
+            "text": " ".join(current_section_blocks)
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import xml.sax.saxutils as saxutils
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Tuple
+
+from . import metrics
+
+# --- Configuration ---
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "azure")  # azure | fake
+# Turns synthesized at the same time (one TTS request each)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# Simulated latency of the fake backend, per turn
+FAKE_TTS_LATENCY_MS = float(os.getenv("FAKE_TTS_LATENCY_MS", "200"))
+
+ALEX_VOICE = "en-US-DavisNeural"
+ANYA_VOICE = "en-US-AriaNeural"
+VOICES = {"alex": ALEX_VOICE, "anya": ANYA_VOICE}
+
+# (voice, text, pause after the turn in ms)
+Turn = Tuple[str, str, int]
+
+class TTSError(RuntimeError):
+    """Speech synthesis of a turn failed."""
+
+def split_turns(script: str) -> List[Turn]:
+    """Splits an 'Alex: ... / Anya: ...' script into one turn per line, after a short intro."""
+    turns = [(ALEX_VOICE, "Welcome to your audio summary.", 1000)]
+    for line in script.strip().split("\n"):
+        speaker, separator, dialogue = line.strip().partition(":")
+        voice = VOICES.get(speaker.strip().lower()) if separator else None
+        if voice and dialogue.strip():
+            turns.append((voice, dialogue.strip(), 750))
+    return turns
+
+def turn_ssml(voice: str, text: str, pause_ms: int) -> str:
+    return (
+        '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" '
+        'xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="en-US">'
+        f'<voice name="{voice}">{saxutils.escape(text)}<break time="{pause_ms}ms"/></voice></speak>'
+    )
+
+# --- Backends ---
+class AzureBackend:
+    """
+    Azure Speech, MP3 output returned in memory. Every pool thread keeps its own long-lived
+    synthesizer, since a synthesizer handles one request at a time.
+    """
+    name = "azure"
+
+    def __init__(self):
+        import azure.cognitiveservices.speech as speechsdk  # imported lazily, slow to load
+        speech_key = os.getenv("AZURE_TTS_KEY")
+        service_region = os.getenv("AZURE_TTS_ENDPOINT")
+        if not speech_key or not service_region:
+            raise ValueError("AZURE_TTS_KEY or AZURE_TTS_ENDPOINT environment variables are not set.")
+        try:
+            region = service_region.split('.')[0].replace('https://', '')
+        except Exception:
+            raise ValueError("AZURE_TTS_ENDPOINT is not a valid endpoint URL.")
+
+        self.speechsdk = speechsdk
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=region)
+        self.speech_config.set_speech_synthesis_output_format(
+            speechsdk.SpeechSynthesisOutputFormat.Audio16Khz64KBitRateMonoMp3
+        )
+        self._local = threading.local()
+
+    def synthesize(self, ssml: str) -> bytes:
+        synthesizer = getattr(self._local, "synthesizer", None)
+        if synthesizer is None:
+            synthesizer = self.speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+            self._local.synthesizer = synthesizer
+        result = synthesizer.speak_ssml_async(ssml).get()
+        if result.reason == self.speechsdk.ResultReason.SynthesizingAudioCompleted:
+            return result.audio_data
+        details = result.cancellation_details
+        raise TTSError(f"Speech synthesis failed: {details.reason} - {details.error_details}")
+
+class FakeBackend:
+    """
+    Offline stand-in for tests and benchmarks: after FAKE_TTS_LATENCY_MS returns silent MP3 frames
+    in the same format as the Azure output (16 kHz mono, 64 kbit/s), about 0.36 s per word.
+    """
+    name = "fake"
+    # MPEG-2 Layer III frame header (64 kbit/s, 16 kHz, mono) + zeroed body = 36 ms of silence
+    FRAME = bytes([0xFF, 0xF3, 0x88, 0xC0]) + bytes(284)
+
+    def __init__(self, latency_ms: float = FAKE_TTS_LATENCY_MS):
+        self.latency = latency_ms / 1000.0
+
+    def synthesize(self, ssml: str) -> bytes:
+        time.sleep(self.latency)
+        words = re.sub(r"<[^>]+>", " ", ssml).split()
+        return self.FRAME * (10 * max(1, len(words)))
+
+_BACKENDS = {"azure": AzureBackend, "fake": FakeBackend}
+
+def create_backend(name: str = TTS_PROVIDER):
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown TTS_PROVIDER '{name}' (expected {' or '.join(_BACKENDS)})")
+    return _BACKENDS[name]()
+
+# --- Shared backend & pool (lazy, thread-safe) ---
+_backend = None
+_backend_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=max(1, TTS_CONCURRENCY), thread_name_prefix="tts")
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def set_backend(backend):
+    """Swaps the TTS backend, e.g. for a FakeBackend in tests or benchmarks."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def _synthesize(backend, ssml: str) -> bytes:
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        audio = backend.synthesize(ssml)
+        outcome = "ok"
+        return audio
+    finally:
+        metrics.TTS_CALL_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+async def synthesize_turns(turns: List[Turn]) -> AsyncIterator[bytes]:
+    """
+    Synthesizes all turns concurrently on the bounded TTS pool and yields their audio in script
+    order, each segment as soon as it and every segment before it are done.
+    Turns that have not started yet are cancelled if the consumer stops early or a turn fails.
+    """
+    backend = await asyncio.to_thread(get_backend)
+    loop = asyncio.get_running_loop()
+    futures = [loop.run_in_executor(_pool, _synthesize, backend, turn_ssml(*turn)) for turn in turns]
+    try:
+        for future in futures:
+            yield await future
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,94 @@
+import logging
+import os
+import pickle
+import struct
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# fsync every appended record before the write is acknowledged
+LOG_FSYNC = os.getenv("VECTOR_LOG_FSYNC", "1") == "1"
+
+# Record frame: payload length, crc32 of the payload
+_HEADER = struct.Struct("<II")
+
+class VectorLog:
+    """
+    Append-only log of index mutations, replayed on top of the last snapshot.
+    Each record is (seq, op, payload) where op is "add" (start_id, vectors) or
+    "remove" (id_ranges). Records are length-prefixed and checksummed, so a write torn by a
+    crash is detected and dropped on replay instead of corrupting the index.
+
+    Readers follow the log with read_new(position), where a position is (inode, offset):
+    the file is never modified by a reader, so tailing is safe while another process appends.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def position(self) -> Optional[Tuple[int, int]]:
+        """(inode, size) of the log file, or None when there is no log."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def append(self, seq: int, op: str, payload) -> Tuple[int, int]:
+        """Appends one record; returns the log position after the write."""
+        data = pickle.dumps((seq, op, payload), protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.path, "ab") as f:
+            f.write(_HEADER.pack(len(data), zlib.crc32(data)))
+            f.write(data)
+            f.flush()
+            if LOG_FSYNC:
+                os.fsync(f.fileno())
+            return os.fstat(f.fileno()).st_ino, f.tell()
+
+    def read_new(self, position: Optional[Tuple[int, int]] = None) -> Tuple[List, Optional[Tuple[int, int]]]:
+        """
+        Returns (records, position) for the complete records after `position`. An incomplete
+        record at the end is left for the next call. A log that was rewritten (other inode)
+        or truncated is read again from the start; callers skip sequence numbers they already have.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return [], None
+        records = []
+        with f:
+            st = os.fstat(f.fileno())
+            offset = 0
+            if position is not None and position[0] == st.st_ino and position[1] <= st.st_size:
+                offset = position[1]
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    break
+                records.append(pickle.loads(data))
+                offset = f.tell()
+        return records, (st.st_ino, offset)
+
+    def repair(self):
+        """
+        Cuts off a torn record at the end so that records appended later are not hidden
+        behind it. Only call this while holding the writer lock.
+        """
+        _, position = self.read_new()
+        if position is not None and position[1] < self.size():
+            logger.warning("Dropping torn record at the end of %s.", self.path.name)
+            os.truncate(self.path, position[1])
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,49 @@
+import pickle
+
+import faiss
+import numpy as np
+
+from services.indexer import PQ_MIN_TRAINING, FaissIndexer, ivfpq_params
+
+def _baseline_store(path, vectors):
+    """A store as the pre-SQLite indexer wrote it: IndexFlatL2 + pickled metadata list."""
+    path.mkdir()
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, str(path / "faiss.index"))
+    metadata = [{"pdf": "doc.pdf", "page": i, "header": f"h{i}", "text": f"t{i}"} for i in range(len(vectors))]
+    with open(path / "metadata.db", "wb") as f:
+        pickle.dump(metadata, f)
+
+def test_migrates_baseline_l2_store(tmp_path):
+    rng = np.random.default_rng(0)
+    # Unnormalized, with very different norms: an inner-product index would rank by norm
+    vectors = (rng.standard_normal((50, 384)) * rng.uniform(0.5, 5, (50, 1))).astype("float32")
+    store = tmp_path / "store"
+    _baseline_store(store, vectors)
+
+    indexer = FaissIndexer(store)
+    assert indexer.wait_for_build(timeout=60)
+    assert indexer.ntotal == 50
+    assert indexer.metric_type == indexer.metric
+    assert not (store / "faiss.index").exists() and not (store / "metadata.db").exists()
+
+    for i in (0, 17, 49):
+        query = vectors[i : i + 1].copy()
+        faiss.normalize_L2(query)
+        hit = indexer.search(query, top_k=1)[0]
+        assert hit["id"] == i and hit["page"] == i
+        assert abs(hit["score"] - 1.0) < 1e-3
+
+    # The converted snapshot is what a fresh process loads
+    reloaded = FaissIndexer(store)
+    assert reloaded.metric_type == reloaded.metric
+    query = vectors[3:4].copy()
+    faiss.normalize_L2(query)
+    assert abs(reloaded.search(query, top_k=1)[0]["score"] - 1.0) < 1e-3
+
+def test_ivfpq_params_keep_full_codes():
+    for n in (PQ_MIN_TRAINING, 50_000, 500_000, 2_000_000):
+        nlist, m, nbits = ivfpq_params(n, 384)
+        assert nbits == 8 and m >= 32 and 384 % m == 0
+        assert n // nlist >= 39
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from services import indexer, ingestion
+from services.manifest import IngestManifest
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexer, "_indexer", indexer.FaissIndexer(tmp_path / "store"))
+    monkeypatch.setattr(ingestion, "_manifest", IngestManifest(tmp_path / "store"))
+    return indexer.get_indexer()
+
+def test_streaming_failure_removes_committed_chunks(store, tmp_path, monkeypatch):
+    def stream(sections):
+        vectors = np.random.default_rng(0).standard_normal((4, 384)).astype("float32")
+        yield vectors.tolist(), [{"pdf": "big.pdf", "page": i, "header": "", "text": "t"} for i in range(4)]
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(ingestion.sectionizer, "iter_sections", lambda path: iter(()))
+    monkeypatch.setattr(ingestion.embedder, "embed_section_stream", stream)
+    pdf_path = tmp_path / "big.pdf"
+    with pytest.raises(RuntimeError):
+        ingestion._ingest_streaming(pdf_path, "digest", ingestion.current_generation())
+
+    assert store.ntotal == 0
+    assert store.search(np.ones((1, 384), dtype="float32"), top_k=5) == []
+    assert ingestion._manifest.get("big.pdf") is None
@@ -1,7 +1,7 @@
 import React from "react";
 
-export default function PodcastPlayer({ podcastUrl }) {
-  if (!podcastUrl) return null;
+export default function PodcastPlayer({ podcastUrl, scriptLines = [], isLoading }) {
+  if (!podcastUrl && scriptLines.length === 0) return null;
 
   return (
     <div className="bg-white p-5 rounded-xl shadow-lg border border-gray-200 h-full">
@@ -13,11 +13,25 @@ export default function PodcastPlayer({ podcastUrl }) {
         <p className="text-sm text-gray-600">
           Listen to an AI-generated summary of the key findings.
         </p>
-        <audio key={podcastUrl} controls className="w-full h-10">
-          {/* The source now uses the prop */}
-          <source src={podcastUrl} type="audio/mpeg" />
-          Your browser does not support the audio element.
-        </audio>
+        {podcastUrl ? (
+          <audio key={podcastUrl} controls className="w-full h-10">
+            {/* The source now uses the prop */}
+            <source src={podcastUrl} type="audio/mpeg" />
+            Your browser does not support the audio element.
+          </audio>
+        ) : (
+          isLoading && (
+            <p className="text-sm text-gray-400 animate-pulse">Synthesizing audio…</p>
+          )
+        )}
+        {/* The script streams in line by line while the audio is being generated */}
+        {scriptLines.length > 0 && (
+          <div className="max-h-48 overflow-y-auto space-y-1 text-sm text-gray-700 bg-gray-50 p-3 rounded-lg">
+            {scriptLines.map((line, idx) => (
+              <p key={idx}>{line}</p>
+            ))}
+          </div>
+        )}
       </div>
     </div>
   );
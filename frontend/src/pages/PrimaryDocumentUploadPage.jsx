@@ -1,6 +1,26 @@
 import React, { useState } from "react";
 import { useNavigate } from "react-router-dom";
 
+// Polls /ingest/jobs/{id} until the ingestion job finishes
+async function waitForIngestJob(jobId, intervalMs = 1000) {
+  while (true) {
+    const response = await fetch(`/ingest/jobs/${jobId}`);
+    if (!response.ok) throw new Error("Failed to check processing status.");
+    const job = await response.json();
+    if (job.status === "completed") return job;
+    if (job.status === "failed") {
+      throw new Error(job.error || "Failed to process document.");
+    }
+    // A new set of documents was uploaded while this one was being processed
+    if (job.status === "cancelled") {
+      throw new Error(
+        "Processing was cancelled because the document library was replaced. Please upload the document again."
+      );
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 export default function PrimaryDocumentUploadPage({ onSubmit }) {
   const [file, setFile] = useState(null);
   const navigate = useNavigate();
@@ -35,6 +55,9 @@ export default function PrimaryDocumentUploadPage({ onSubmit }) {
         const errData = await response.json();
         throw new Error(errData.detail || "Failed to process document.");
       }
+      // Indexing runs in the background; wait until the job is done
+      const { job_id } = await response.json();
+      await waitForIngestJob(job_id);
       onSubmit(file); // Navigate on success
     } catch (err) {
       setError(err.message);
@@ -5,6 +5,22 @@ import SnippetNavigator from "../components/SnippetNavigator";
 import InsightsPanel from "../components/InsightsPanel";
 import PodcastPlayer from "../components/PodcastPlayer";
 
+// Reads a streamed NDJSON response, calling onEvent with each JSON line as it arrives
+async function readNdjson(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)));
+  }
+  if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
 export default function ResultsDisplayPage({
   primaryDocument,
   knowledgeBaseFiles,
@@ -14,6 +30,7 @@ export default function ResultsDisplayPage({
   const navigate = useNavigate();
   const [insights, setInsights] = useState([]);
   const [podcastUrl, setPodcastUrl] = useState(null);
+  const [podcastScript, setPodcastScript] = useState([]);
   const [isLoadingInsights, setIsLoadingInsights] = useState(true);
   const [isLoadingPodcast, setIsLoadingPodcast] = useState(true);
 
@@ -34,19 +51,32 @@ export default function ResultsDisplayPage({
     }
 
     const sectionsPayload = snippets;
+    // Streams are long-lived: stop reading them when the page goes away
+    const controller = new AbortController();
 
     const fetchInsights = async () => {
       setIsLoadingInsights(true);
+      // One slot per section, filled in as each insight arrives
+      setInsights(new Array(sectionsPayload.length).fill(null));
       try {
-        const response = await fetch("/insights/", {
+        const response = await fetch("/insights/stream", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(sectionsPayload),
+          signal: controller.signal,
         });
         if (!response.ok) throw new Error("Failed to load insights.");
-        const data = await response.json();
-        setInsights(data.insights);
+        await readNdjson(response, (event) => {
+          if (event.type === "insight") {
+            setInsights((current) => {
+              const next = [...current];
+              next[event.index] = event.insight;
+              return next;
+            });
+          }
+        });
       } catch (error) {
+        if (error.name === "AbortError") return;
         console.error("Error fetching insights:", error);
         setInsights([]);
       } finally {
@@ -56,16 +86,27 @@ export default function ResultsDisplayPage({
 
     const fetchPodcast = async () => {
       setIsLoadingPodcast(true);
+      setPodcastScript([]);
       try {
-        const response = await fetch("/podcast/", {
+        const response = await fetch("/podcast/stream", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(sectionsPayload),
+          signal: controller.signal,
         });
         if (!response.ok) throw new Error("Failed to generate podcast.");
-        const data = await response.json();
-        setPodcastUrl(data.podcast_url);
+        await readNdjson(response, (event) => {
+          if (event.type === "line") {
+            setPodcastScript((current) => [...current, event.line]);
+          } else if (event.type === "audio") {
+            // Streams the audio while later turns are still being synthesized
+            setPodcastUrl(event.podcast_url);
+          } else if (event.type === "error") {
+            throw new Error(event.detail);
+          }
+        });
       } catch (error) {
+        if (error.name === "AbortError") return;
         console.error("Error fetching podcast:", error);
       } finally {
         setIsLoadingPodcast(false);
@@ -74,6 +115,7 @@ export default function ResultsDisplayPage({
 
     fetchInsights();
     fetchPodcast();
+    return () => controller.abort();
   }, [snippets, primaryDocument, navigate]);
 
   const handleApisReady = (apis) => {
@@ -119,7 +161,11 @@ export default function ResultsDisplayPage({
           onSnippetClick={handleSnippetClick}
         />
         <InsightsPanel insights={insights} isLoading={isLoadingInsights} />
-        <PodcastPlayer podcastUrl={podcastUrl} isLoading={isLoadingPodcast} />
+        <PodcastPlayer
+          podcastUrl={podcastUrl}
+          scriptLines={podcastScript}
+          isLoading={isLoadingPodcast}
+        />
         {/* ------------------------- */}
 
         <button